@@ -0,0 +1,128 @@
+"""A minimal ASGI stand-in for a RAGEngine service, used by the benchmarks in this directory.
+
+It answers the routes the benchmarks exercise with canned payloads shaped like the real service, after an optional
+artificial service time, so client-side overhead can be compared without a model or vector store behind it.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+def retrieve_payload(query: str, node_count: int = 5) -> dict[str, Any]:
+    return {
+        "query": query,
+        "results": [
+            {
+                "doc_id": f"doc-{i}",
+                "node_id": f"node-{i}",
+                "text": "Retrieval-augmented generation (RAG) is a technique... " * 4,
+                "score": 1.0 - i / (node_count + 1),
+                "metadata": {"category": "technical", "author": "John Doe"},
+            }
+            for i in range(node_count)
+        ],
+        "count": node_count,
+    }
+
+
+class RAGEngineStandIn:
+    """ASGI application emulating the RAGEngine endpoints used by the benchmarks
+
+    Args:
+        service_time: Seconds every request sleeps before answering, emulating server-side work.
+        node_count: Number of nodes returned by ``/retrieve``.
+    """
+
+    def __init__(self, service_time: float = 0.0, node_count: int = 5):
+        self.service_time = service_time
+        self.node_count = node_count
+        self.requests = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        self.requests += 1
+        if self.service_time:
+            await asyncio.sleep(self.service_time)
+
+        status, payload = self.handle(scope["method"], scope["path"], scope.get("headers", []), body)
+        content = json.dumps(payload).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode())],
+            }
+        )
+        await send({"type": "http.response.body", "body": content})
+
+    def handle(self, method: str, path: str, headers: list[tuple[bytes, bytes]], body: bytes) -> tuple[int, Any]:
+        if method == "POST" and path == "/retrieve":
+            request = json.loads(body)
+            return 200, retrieve_payload(request["query"], self.node_count)
+        if method == "GET" and path == "/health":
+            return 200, {"status": "Healthy"}
+        if method == "GET" and path == "/indexes":
+            return 200, ["test_index"]
+        return 404, {"detail": "Not Found"}
+
+
+def serve_in_thread(app: Any, bind: str, http2: bool = False) -> Callable[[], None]:
+    """Serve ``app`` with hypercorn on a background thread and return a function that stops it
+
+    ``bind`` is anything hypercorn accepts, e.g. ``127.0.0.1:8765`` or ``unix:/tmp/rag.sock``. With ``http2`` the
+    server also accepts HTTP/2 with prior knowledge (h2c) on the plain-text socket.
+    """
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [bind]
+    config.alpn_protocols = ["h2", "http/1.1"] if http2 else ["http/1.1"]
+    config.h2_max_concurrent_streams = 1000
+    config.keep_alive_max_requests = 1_000_000
+    config.backlog = 2048
+    config.loglevel = "WARNING"
+    config.accesslog = None
+
+    loop = asyncio.new_event_loop()
+    shutdown = asyncio.Event()
+    started = threading.Event()
+
+    async def _run() -> None:
+        started.set()
+        await serve(app, config, shutdown_trigger=shutdown.wait)
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(_run(),), daemon=True)
+    thread.start()
+    started.wait()
+    # Give hypercorn a moment to bind the socket before the first request.
+    time.sleep(0.5)
+
+    def stop() -> None:
+        loop.call_soon_threadsafe(shutdown.set)
+        thread.join(timeout=5)
+
+    return stop
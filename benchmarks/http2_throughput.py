@@ -0,0 +1,74 @@
+"""Compare HTTP/1.1 and HTTP/2 throughput of ``retrieve_index.asyncio`` against a local stand-in server
+
+Requires ``hypercorn`` and the ``http2`` extra (``pip install hypercorn kaito-rag-engine-client[http2]``).
+
+    python benchmarks/http2_throughput.py --service-time 0.005 --requests 2048
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from _standin import RAGEngineStandIn, serve_in_thread
+
+from kaito_rag_engine_client import Client
+from kaito_rag_engine_client.api.index import retrieve_index
+from kaito_rag_engine_client.models import RetrieveRequest
+
+CONCURRENCY = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+async def _run(client: Client, concurrency: int, total: int) -> float:
+    body = RetrieveRequest(index_name="test_index", query="what is RAG?", max_node_count=5)
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            response = await retrieve_index.asyncio_detailed(client=client, body=body)
+            assert response.status_code == 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def _bench(base_url: str, http2: bool, concurrency: int, total: int, max_connections: int) -> float:
+    client = Client(
+        base_url=base_url,
+        http2=http2,
+        http1=not http2,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=httpx.Timeout(60.0),
+    )
+    async with client:
+        # One untimed round so both modes start from an established connection.
+        await _run(client, 1, 1)
+        return await _run(client, concurrency, total)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--service-time", type=float, default=0.005, help="seconds the stand-in spends per request")
+    parser.add_argument("--requests", type=int, default=2048, help="requests per concurrency level")
+    parser.add_argument("--max-connections", type=int, default=100, help="connection pool size for both modes")
+    args = parser.parse_args()
+
+    stop = serve_in_thread(RAGEngineStandIn(service_time=args.service_time), f"127.0.0.1:{args.port}", http2=True)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        print(f"{'concurrency':>11}  {'HTTP/1.1 req/s':>14}  {'HTTP/2 req/s':>12}  {'speedup':>7}")
+        for concurrency in CONCURRENCY:
+            total = max(args.requests, concurrency * 4)
+            h1 = asyncio.run(_bench(base_url, False, concurrency, total, args.max_connections))
+            h2 = asyncio.run(_bench(base_url, True, concurrency, total, args.max_connections))
+            print(f"{concurrency:>11}  {h1:>14.0f}  {h2:>12.0f}  {h2 / h1:>6.2f}x")
+    finally:
+        stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Helpers shared by the transports wrapping the client's connection pools"""
+
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+
+import httpx
+
+
+def copy_request(request: httpx.Request) -> httpx.Request:
+    """Copy a request whose body has been read, so that it can be sent more than once
+
+    Transports below may rewrite the URL and headers of the request they receive, so every attempt gets its own copy.
+    The copy shares the already serialized body bytes.
+    """
+    return httpx.Request(
+        request.method,
+        request.url,
+        headers=request.headers,
+        content=request.content,
+        extensions=dict(request.extensions),
+    )
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]) -> None:
+        self._stream = stream
+        self._release: Callable[[], None] | None = release
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if self._release is not None:
+                self._release, release = None, self._release
+                release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], Awaitable[None]]) -> None:
+        self._stream = stream
+        self._release: Callable[[], Awaitable[None]] | None = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release, release = None, self._release
+                await release()
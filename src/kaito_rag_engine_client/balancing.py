@@ -0,0 +1,384 @@
+"""Client-side load balancing across several RAGEngine replicas
+
+A ``Client`` constructed with a list of base URLs, or with a ``resolver`` discovering the replicas behind a headless
+service, routes every request through a ``LoadBalancingTransport``. It picks one replica per request and rewrites the
+request's scheme, host and port to it. Every replica keeps its own connection pool, so keep-alive connections never
+pin the client to one replica.
+"""
+
+import random
+import threading
+import time
+from collections.abc import Callable, Iterable, Sequence
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+import httpx
+from attrs import define, field
+
+from ._transport import _AsyncReleasingStream, _ReleasingStream
+
+if TYPE_CHECKING:
+    from .discovery import ServiceDiscovery
+
+
+ENDPOINT_EXTENSION = "kaito_rag_endpoint"
+"""Request extension pinning a request to one ``Endpoint`` instead of letting the balancer pick, e.g. for probes"""
+
+
+@define(eq=False)
+class Endpoint:
+    """A replica requests can be routed to, together with the statistics the balancers use
+
+    Attributes:
+        url: The origin (scheme, host and port) requests to this replica are sent to.
+        outstanding: Number of requests sent to the replica whose response has not been closed yet.
+        latency: Exponentially weighted moving average of the time to response headers, in seconds. None until the
+            first response was observed.
+        healthy: Whether the replica is in rotation. Unhealthy replicas are only picked when no replica is healthy.
+        authority: The ``Host`` header and TLS server name of requests to the replica, when they should not be taken
+            from ``url``. Set for replicas discovered by IP address.
+    """
+
+    url: httpx.URL = field(converter=httpx.URL)
+    outstanding: int = 0
+    latency: float | None = None
+    healthy: bool = True
+    authority: str | None = None
+
+
+class LoadBalancer:
+    """Base class for the strategies picking an ``Endpoint`` for each request
+
+    Subclasses implement ``pick``. All methods are called with the owning ``EndpointSet``'s lock held.
+    """
+
+    def pick(self, endpoints: Sequence[Endpoint]) -> Endpoint:
+        raise NotImplementedError
+
+    def observe(self, endpoint: Endpoint, elapsed: float, failed: bool) -> None:
+        """Record the time a request to ``endpoint`` took until its response headers arrived"""
+
+
+class RoundRobin(LoadBalancer):
+    """Sends requests to each replica in turn"""
+
+    def __init__(self) -> None:
+        self._next = 0
+
+    def pick(self, endpoints: Sequence[Endpoint]) -> Endpoint:
+        endpoint = endpoints[self._next % len(endpoints)]
+        self._next += 1
+        return endpoint
+
+
+def _least(endpoints: Sequence[Endpoint], cost: Callable[[Endpoint], float]) -> Endpoint:
+    # Start the scan at a random replica so ties do not always go to the first one in the list.
+    start = random.randrange(len(endpoints))
+    return min((endpoints[(start + i) % len(endpoints)] for i in range(len(endpoints))), key=cost)
+
+
+class LeastOutstandingRequests(LoadBalancer):
+    """Sends each request to the replica with the fewest requests in flight"""
+
+    def pick(self, endpoints: Sequence[Endpoint]) -> Endpoint:
+        return _least(endpoints, lambda endpoint: endpoint.outstanding)
+
+
+class EWMALatency(LoadBalancer):
+    """Sends each request to the replica with the lowest latency average weighted by its requests in flight
+
+    Args:
+        alpha: Weight of the newest sample in the moving average, between 0 and 1.
+        failure_penalty: Latency in seconds recorded for a request that failed or returned a 5xx status, when the
+            failure was faster than that.
+    """
+
+    def __init__(self, alpha: float = 0.3, failure_penalty: float = 1.0) -> None:
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        self.alpha = alpha
+        self.failure_penalty = failure_penalty
+
+    def pick(self, endpoints: Sequence[Endpoint]) -> Endpoint:
+        # Replicas without a sample yet cost nothing, so each of them is tried before the averages are trusted.
+        return _least(endpoints, lambda endpoint: (endpoint.latency or 0.0) * (endpoint.outstanding + 1))
+
+    def observe(self, endpoint: Endpoint, elapsed: float, failed: bool) -> None:
+        if failed:
+            elapsed = max(elapsed, self.failure_penalty)
+        if endpoint.latency is None:
+            endpoint.latency = elapsed
+        else:
+            endpoint.latency += self.alpha * (elapsed - endpoint.latency)
+
+
+class EndpointSet:
+    """The replicas of one client and the balancer choosing between them, shared by its sync and async transports
+
+    Args:
+        urls: The base URLs of the replicas. They must differ only in scheme, host and port.
+        balancer: The strategy picking a replica per request. Defaults to ``RoundRobin``.
+        discovery: Discovers the replicas instead of ``urls``. The first request resolves the service, later
+            requests start a background resolution once ``discovery.interval`` elapsed.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str | httpx.URL] = (),
+        balancer: LoadBalancer | None = None,
+        discovery: "ServiceDiscovery | None" = None,
+    ) -> None:
+        if not urls and discovery is None:
+            raise ValueError("At least one endpoint URL is required")
+        self.balancer = balancer if balancer is not None else RoundRobin()
+        self.discovery = discovery
+        self.version = 0
+        self._endpoints = [Endpoint(url) for url in urls]
+        self._lock = threading.Lock()
+        self._next_refresh = 0.0
+        self._refreshing = False
+
+    @property
+    def endpoints(self) -> list[Endpoint]:
+        """A snapshot of the replicas currently in the set"""
+        with self._lock:
+            return list(self._endpoints)
+
+    def update(self, urls: Iterable[str | httpx.URL], authority: str | None = None) -> None:
+        """Replace the replicas, keeping the statistics of those that remain"""
+        with self._lock:
+            current = {endpoint.url: endpoint for endpoint in self._endpoints}
+            endpoints = []
+            for url in map(httpx.URL, urls):
+                endpoint = current.get(url) or Endpoint(url, authority=authority)
+                endpoint.authority = authority
+                endpoints.append(endpoint)
+            if endpoints != self._endpoints:
+                self._endpoints = endpoints
+                self.version += 1
+
+    def refresh(self) -> None:
+        """Resolve the replicas again through ``discovery``
+
+        Raises:
+            httpx.ConnectError: If the service could not be resolved. The current replicas are kept.
+        """
+        if self.discovery is not None:
+            self.update(self.discovery.resolve(), self.discovery.authority)
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except httpx.ConnectError:
+            # Keep routing to the replicas resolved last time, the next interval tries again.
+            pass
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _maybe_refresh(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._endpoints and (self._refreshing or now < self._next_refresh):
+                return
+            self._next_refresh = now + self.discovery.interval  # type: ignore[union-attr]
+            initial = not self._endpoints
+            self._refreshing = not initial
+        if initial:
+            self.refresh()
+        else:
+            threading.Thread(target=self._refresh_in_background, name="kaito-rag-discovery", daemon=True).start()
+
+    def acquire(self, pinned: Endpoint | None = None) -> Endpoint:
+        """Pick the replica for a new request, or take ``pinned``, and count the request as outstanding on it"""
+        if self.discovery is not None and pinned is None:
+            self._maybe_refresh()
+        with self._lock:
+            if pinned is not None:
+                endpoint = pinned
+            else:
+                candidates = [endpoint for endpoint in self._endpoints if endpoint.healthy] or self._endpoints
+                endpoint = self.balancer.pick(candidates)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def observe(self, endpoint: Endpoint, elapsed: float, failed: bool) -> None:
+        with self._lock:
+            self.balancer.observe(endpoint, elapsed, failed)
+
+    def release(self, endpoint: Endpoint) -> None:
+        with self._lock:
+            endpoint.outstanding -= 1
+
+
+def _route(request: httpx.Request, endpoint: Endpoint) -> None:
+    request.url = request.url.copy_with(scheme=endpoint.url.scheme, host=endpoint.url.host, port=endpoint.url.port)
+    if endpoint.authority is None:
+        request.headers["Host"] = endpoint.url.netloc.decode("ascii")
+    else:
+        request.headers["Host"] = endpoint.authority
+        request.extensions["sni_hostname"] = httpx.URL(f"//{endpoint.authority}").host
+
+
+TransportT = TypeVar("TransportT", httpx.BaseTransport, httpx.AsyncBaseTransport)
+
+
+class _Pools(Generic[TransportT]):
+    """One transport, i.e. one connection pool, per replica
+
+    Pools of replicas that left the ``EndpointSet`` are handed back for closing once their last request finished.
+    """
+
+    def __init__(self, factory: Callable[[], TransportT] | None, shared: TransportT | None) -> None:
+        if (factory is None) == (shared is None):
+            raise ValueError("Pass exactly one of transport_factory and transport")
+        self._factory = factory
+        self._shared = shared
+        self._pools: dict[httpx.URL, TransportT] = {}
+        self._in_flight: dict[httpx.URL, int] = {}
+        self._stale: set[httpx.URL] = set()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _take_idle_stale(self) -> list[TransportT]:
+        idle = [url for url in self._stale if not self._in_flight.get(url)]
+        self._stale.difference_update(idle)
+        for url in idle:
+            self._in_flight.pop(url, None)
+        return [self._pools.pop(url) for url in idle]
+
+    def checkout(self, endpoint: Endpoint, endpoints: EndpointSet) -> tuple[TransportT, list[TransportT]]:
+        """Return the pool of ``endpoint`` and the pools that can be closed now"""
+        if self._shared is not None:
+            return self._shared, []
+        version = endpoints.version
+        live = {e.url for e in endpoints.endpoints} if version != self._version else None
+        with self._lock:
+            if live is not None:
+                self._version = version
+                self._stale = (self._stale | self._pools.keys()) - live
+            pool = self._pools.get(endpoint.url)
+            if pool is None:
+                pool = self._pools[endpoint.url] = self._factory()  # type: ignore[misc]
+            self._in_flight[endpoint.url] = self._in_flight.get(endpoint.url, 0) + 1
+            return pool, self._take_idle_stale()
+
+    def checkin(self, endpoint: Endpoint) -> list[TransportT]:
+        """Record that a request to ``endpoint`` finished and return the pools that can be closed now"""
+        if self._shared is not None:
+            return []
+        with self._lock:
+            self._in_flight[endpoint.url] -= 1
+            return self._take_idle_stale()
+
+    def all(self) -> list[TransportT]:
+        with self._lock:
+            return [self._shared] if self._shared is not None else list(self._pools.values())
+
+
+class LoadBalancingTransport(httpx.BaseTransport):
+    """Routes each request to the replica the ``EndpointSet`` picks
+
+    Args:
+        endpoints: The replicas and balancer, usually shared with an ``AsyncLoadBalancingTransport``.
+        transport_factory: Builds the transport of a replica the first time a request is routed to it.
+        transport: A single transport handling the requests of every replica instead, e.g. an
+            ``httpx.MockTransport`` in tests.
+    """
+
+    def __init__(
+        self,
+        endpoints: EndpointSet,
+        transport_factory: Callable[[], httpx.BaseTransport] | None = None,
+        transport: httpx.BaseTransport | None = None,
+    ) -> None:
+        self.endpoints = endpoints
+        self._pools = _Pools(transport_factory, transport)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        pinned = request.extensions.get(ENDPOINT_EXTENSION)
+        endpoint = self.endpoints.acquire(pinned)
+        _route(request, endpoint)
+        pool, closable = self._pools.checkout(endpoint, self.endpoints)
+        for stale in closable:
+            stale.close()
+
+        def release() -> None:
+            self.endpoints.release(endpoint)
+            for stale in self._pools.checkin(endpoint):
+                stale.close()
+
+        start = time.perf_counter()
+        try:
+            response = pool.handle_request(request)
+        except BaseException:
+            if pinned is None:
+                self.endpoints.observe(endpoint, time.perf_counter() - start, failed=True)
+            release()
+            raise
+        if pinned is None:
+            self.endpoints.observe(endpoint, time.perf_counter() - start, failed=response.status_code >= 500)
+        assert isinstance(response.stream, httpx.SyncByteStream)
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    def close(self) -> None:
+        for pool in self._pools.all():
+            pool.close()
+
+
+class AsyncLoadBalancingTransport(httpx.AsyncBaseTransport):
+    """The async counterpart of ``LoadBalancingTransport``"""
+
+    def __init__(
+        self,
+        endpoints: EndpointSet,
+        transport_factory: Callable[[], httpx.AsyncBaseTransport] | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.endpoints = endpoints
+        self._pools = _Pools(transport_factory, transport)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        pinned = request.extensions.get(ENDPOINT_EXTENSION)
+        endpoint = self.endpoints.acquire(pinned)
+        _route(request, endpoint)
+        pool, closable = self._pools.checkout(endpoint, self.endpoints)
+        for stale in closable:
+            await stale.aclose()
+
+        async def release() -> None:
+            self.endpoints.release(endpoint)
+            for stale in self._pools.checkin(endpoint):
+                await stale.aclose()
+
+        start = time.perf_counter()
+        try:
+            response = await pool.handle_async_request(request)
+        except BaseException:
+            if pinned is None:
+                self.endpoints.observe(endpoint, time.perf_counter() - start, failed=True)
+            await release()
+            raise
+        if pinned is None:
+            self.endpoints.observe(endpoint, time.perf_counter() - start, failed=response.status_code >= 500)
+        assert isinstance(response.stream, httpx.AsyncByteStream)
+        response.stream = _AsyncReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        for pool in self._pools.all():
+            await pool.aclose()
+
+
+__all__ = [
+    "ENDPOINT_EXTENSION",
+    "AsyncLoadBalancingTransport",
+    "EWMALatency",
+    "Endpoint",
+    "EndpointSet",
+    "LeastOutstandingRequests",
+    "LoadBalancer",
+    "LoadBalancingTransport",
+    "RoundRobin",
+]
@@ -0,0 +1,236 @@
+"""Circuit breaking per replica and route
+
+A circuit breaker counts consecutive failures, i.e. transport errors and server error statuses, of every replica and
+route (``POST /v1/chat/completions``, ``POST /retrieve``, ``GET /indexes/{index_name}/documents``, ...). Once a circuit
+has seen too many, it opens and its calls fail fast with ``errors.CircuitOpenError`` instead of waiting for timeouts
+and holding on to pool slots. After ``reset_timeout`` a few trial calls are let through, half-open, and their outcome
+closes or re-opens the circuit.
+"""
+
+import enum
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Collection
+
+import httpx
+
+from .errors import CircuitOpenError
+from .routes import match_route
+
+CircuitKey = tuple[str, str]
+"""The base URL of a replica and the ``"METHOD template"`` of a route"""
+
+
+class CircuitState(str, enum.Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class _Circuit:
+    __slots__ = ("state", "failures", "opened_at", "trials")
+
+    def __init__(self) -> None:
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trials = 0
+
+
+def circuit_key(request: httpx.Request) -> CircuitKey:
+    """The circuit ``request`` counts towards, by the replica it is sent to and its route"""
+    url = request.url
+    route = match_route(request)
+    return (
+        f"{url.scheme}://{url.netloc.decode('ascii')}",
+        str(route) if route is not None else f"{request.method} {url.path}",
+    )
+
+
+class CircuitBreaker:
+    """Keeps a circuit per replica and route and decides which calls may be sent
+
+    Args:
+        failure_threshold: Consecutive failures after which a closed circuit opens.
+        reset_timeout: Seconds an open circuit fails fast before it lets trial calls through.
+        half_open_max_calls: Number of concurrent trial calls of a half-open circuit. The circuit closes when one
+            succeeds and opens again when one fails.
+        failure_statuses: Response status codes that count as failures. Other responses, including 4xx and 429, show
+            that the replica is answering and count as successes.
+        on_transition: Called with the circuit key, the old and the new state on every state change, e.g. to update
+            a metrics gauge. It is called outside the breaker's lock.
+
+    Attributes:
+        transitions: Number of state changes by (old state, new state), across all circuits.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        failure_statuses: Collection[int] = frozenset({500, 502, 503, 504}),
+        on_transition: Callable[[CircuitKey, CircuitState, CircuitState], None] | None = None,
+    ) -> None:
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        if half_open_max_calls < 1:
+            raise ValueError("half_open_max_calls must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.failure_statuses = frozenset(failure_statuses)
+        self.on_transition = on_transition
+        self.transitions: Counter[tuple[CircuitState, CircuitState]] = Counter()
+        self._circuits: dict[CircuitKey, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    def state(self, base_url: str, route: str) -> CircuitState:
+        """The current state of the circuit of a replica and a ``"METHOD template"`` route
+
+        An open circuit whose ``reset_timeout`` has passed is reported open until a call tries it.
+        """
+        with self._lock:
+            circuit = self._circuits.get((base_url.rstrip("/"), route))
+            return CircuitState.CLOSED if circuit is None else circuit.state
+
+    def states(self) -> dict[CircuitKey, CircuitState]:
+        """A snapshot of the state of every circuit that has seen a call"""
+        with self._lock:
+            return {key: circuit.state for key, circuit in self._circuits.items()}
+
+    def _set_state(self, circuit: _Circuit, state: CircuitState) -> tuple[CircuitState, CircuitState]:
+        change = (circuit.state, state)
+        circuit.state = state
+        circuit.failures = 0
+        if state is CircuitState.OPEN:
+            circuit.opened_at = time.monotonic()
+        self.transitions[change] += 1
+        return change
+
+    def _notify(self, key: CircuitKey, change: tuple[CircuitState, CircuitState] | None) -> None:
+        if change is not None and self.on_transition is not None:
+            self.on_transition(key, *change)
+
+    def acquire(self, key: CircuitKey) -> bool:
+        """Admit a call to the circuit ``key`` or raise ``errors.CircuitOpenError``
+
+        Returns:
+            Whether the call is a trial call of a half-open circuit, to be passed on to ``release``.
+        """
+        change = None
+        try:
+            with self._lock:
+                circuit = self._circuits.get(key)
+                if circuit is None:
+                    circuit = self._circuits[key] = _Circuit()
+                if circuit.state is CircuitState.OPEN:
+                    retry_in = circuit.opened_at + self.reset_timeout - time.monotonic()
+                    if retry_in > 0:
+                        raise CircuitOpenError(key[0], key[1], retry_in)
+                    change = self._set_state(circuit, CircuitState.HALF_OPEN)
+                if circuit.state is CircuitState.CLOSED:
+                    return False
+                if circuit.trials >= self.half_open_max_calls:
+                    raise CircuitOpenError(key[0], key[1], 0.0)
+                circuit.trials += 1
+                return True
+        finally:
+            self._notify(key, change)
+
+    def release(self, key: CircuitKey, trial: bool, failed: bool | None) -> None:
+        """Record the outcome of a call admitted by ``acquire``
+
+        Args:
+            key: The circuit of the call.
+            trial: What ``acquire`` returned for the call.
+            failed: Whether the call failed, None if it was abandoned (e.g. cancelled) without an outcome.
+        """
+        change = None
+        with self._lock:
+            circuit = self._circuits[key]
+            if trial:
+                circuit.trials -= 1
+            if failed is None:
+                pass
+            elif failed:
+                if circuit.state is CircuitState.HALF_OPEN:
+                    change = self._set_state(circuit, CircuitState.OPEN)
+                elif circuit.state is CircuitState.CLOSED:
+                    circuit.failures += 1
+                    if circuit.failures >= self.failure_threshold:
+                        change = self._set_state(circuit, CircuitState.OPEN)
+            elif circuit.state is CircuitState.CLOSED:
+                circuit.failures = 0
+            elif circuit.state is CircuitState.HALF_OPEN and trial:
+                change = self._set_state(circuit, CircuitState.CLOSED)
+            # Late successes of calls admitted before the circuit opened do not close it.
+        self._notify(key, change)
+
+
+class CircuitBreakerTransport(httpx.BaseTransport):
+    """Fails requests fast while the circuit of their replica and route is open
+
+    Args:
+        transport: The transport admitted requests are sent through.
+        breaker: The circuit breaker, usually shared with an ``AsyncCircuitBreakerTransport``.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, breaker: CircuitBreaker) -> None:
+        self._transport = transport
+        self.breaker = breaker
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = circuit_key(request)
+        trial = self.breaker.acquire(key)
+        failed = None
+        try:
+            response = self._transport.handle_request(request)
+        except httpx.TransportError:
+            failed = True
+            raise
+        else:
+            failed = response.status_code in self.breaker.failure_statuses
+            return response
+        finally:
+            self.breaker.release(key, trial, failed)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncCircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """The async counterpart of ``CircuitBreakerTransport``"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker) -> None:
+        self._transport = transport
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = circuit_key(request)
+        trial = self.breaker.acquire(key)
+        failed = None
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.TransportError:
+            failed = True
+            raise
+        else:
+            failed = response.status_code in self.breaker.failure_statuses
+            return response
+        finally:
+            self.breaker.release(key, trial, failed)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+__all__ = [
+    "AsyncCircuitBreakerTransport",
+    "CircuitBreaker",
+    "CircuitBreakerTransport",
+    "CircuitKey",
+    "CircuitState",
+    "circuit_key",
+]
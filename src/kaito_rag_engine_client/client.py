@@ -1,9 +1,147 @@
+import asyncio
 import ssl
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Any
 
 import httpx
 from attrs import define, evolve, field
 
+from .balancing import AsyncLoadBalancingTransport, EndpointSet, LoadBalancer, LoadBalancingTransport
+from .breaker import AsyncCircuitBreakerTransport, CircuitBreaker, CircuitBreakerTransport
+from .discovery import Resolver, ServiceDiscovery
+from .hedging import AsyncHedgingTransport, HedgingPolicy, HedgingTransport
+from .limiter import AsyncConcurrencyLimitTransport, ConcurrencyLimiter, ConcurrencyLimitTransport
+from .retry import AsyncRetryTransport, RetryPolicy, RetryTransport
+
+
+class _ConnectionSetupTimer:
+    """Measures how long a request spent opening a new connection, from httpcore ``trace`` events"""
+
+    def __init__(self) -> None:
+        self._started: float | None = None
+        self.elapsed: float | None = None
+
+    def trace(self, event_name: str, info: dict[str, Any]) -> None:
+        if event_name.startswith("connection.connect_") and event_name.endswith(".started"):
+            self._started = time.perf_counter()
+        elif self._started is not None and event_name in (
+            "connection.connect_tcp.complete",
+            "connection.connect_unix_socket.complete",
+            "connection.start_tls.complete",
+        ):
+            self.elapsed = time.perf_counter() - self._started
+
+    async def atrace(self, event_name: str, info: dict[str, Any]) -> None:
+        self.trace(event_name, info)
+
+
+def _check_warm_up_size(n_connections: int, limits: httpx.Limits) -> None:
+    if n_connections < 1:
+        raise ValueError("n_connections must be at least 1")
+    if limits.max_connections is not None and n_connections > limits.max_connections:
+        raise ValueError(f"Cannot warm up {n_connections} connections with limits.max_connections={limits.max_connections}")
+
+
+def _warm_up(client: httpx.Client, n_connections: int) -> list[float]:
+    # Every probe keeps its response open until all probes have one, so each of them checks out its own connection.
+    barrier = threading.Barrier(n_connections)
+
+    def probe() -> float | None:
+        timer = _ConnectionSetupTimer()
+        try:
+            with client.stream("GET", "/health", extensions={"trace": timer.trace}) as response:
+                barrier.wait()
+                # Reading the body to the end is what returns the connection to the pool.
+                response.read()
+        except BaseException:
+            barrier.abort()
+            raise
+        return timer.elapsed
+
+    with ThreadPoolExecutor(max_workers=n_connections, thread_name_prefix="warm-up") as executor:
+        futures = [executor.submit(probe) for _ in range(n_connections)]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise next((e for e in errors if not isinstance(e, threading.BrokenBarrierError)), errors[0])
+    return [elapsed for future in futures if (elapsed := future.result()) is not None]
+
+
+async def _async_warm_up(client: httpx.AsyncClient, n_connections: int) -> list[float]:
+    all_open = asyncio.Event()
+    opened = 0
+
+    async def probe() -> float | None:
+        nonlocal opened
+        timer = _ConnectionSetupTimer()
+        try:
+            async with client.stream("GET", "/health", extensions={"trace": timer.atrace}) as response:
+                opened += 1
+                if opened == n_connections:
+                    all_open.set()
+                await all_open.wait()
+                await response.aread()
+        finally:
+            all_open.set()
+        return timer.elapsed
+
+    results = await asyncio.gather(*(probe() for _ in range(n_connections)))
+    return [elapsed for elapsed in results if elapsed is not None]
+
+
+def _primary_base_url(base_url: str | list[str]) -> str:
+    # With several replicas the httpx base_url only anchors relative paths, the transport picks the replica.
+    return base_url if isinstance(base_url, str) else base_url[0]
+
+
+def _wrapped(layer: Callable[..., Any], policy: Any, new_transport: Callable[[], Any]) -> Any:
+    return layer(new_transport(), policy)
+
+
+def _httpx_args_with_transport(client: "Client | AuthenticatedClient", asynchronous: bool) -> dict[str, Any]:
+    httpx_args = dict(client._httpx_args)
+    # Policy transports wrapping the connection pools, innermost first.
+    layers = [
+        (ConcurrencyLimitTransport, AsyncConcurrencyLimitTransport, client._limiter),
+        (HedgingTransport, AsyncHedgingTransport, client._hedging),
+        (RetryTransport, AsyncRetryTransport, client._retry),
+    ]
+    layers = [layer for layer in layers if layer[2] is not None]
+    breaker = client._circuit_breaker
+    if client._endpoint_set is None and not layers and breaker is None:
+        return httpx_args
+
+    transport = httpx_args.pop("transport", None)
+    new_pool = partial(
+        httpx.AsyncHTTPTransport if asynchronous else httpx.HTTPTransport,
+        verify=client._verify_ssl,
+        http1=client._http1,
+        http2=client._http2,
+        limits=client._limits,
+    )
+    if breaker is not None:
+        # The breaker sits below the load balancer, where requests already carry the address of their replica.
+        breaker_layer = AsyncCircuitBreakerTransport if asynchronous else CircuitBreakerTransport
+        if transport is not None:
+            transport = breaker_layer(transport, breaker)
+        else:
+            new_pool = partial(_wrapped, breaker_layer, breaker, new_pool)
+    if client._endpoint_set is not None:
+        # A transport passed in httpx_args serves every replica, otherwise each replica gets its own connection pool.
+        balancing_transport = AsyncLoadBalancingTransport if asynchronous else LoadBalancingTransport
+        transport = balancing_transport(
+            client._endpoint_set, transport_factory=None if transport is not None else new_pool, transport=transport
+        )
+    elif transport is None:
+        transport = new_pool()
+    for sync_layer, async_layer, policy in layers:
+        transport = (async_layer if asynchronous else sync_layer)(transport, policy)
+    httpx_args["transport"] = transport
+    return httpx_args
+
 
 @define
 class Client:
@@ -11,7 +149,9 @@ class Client:
 
     The following are accepted as keyword arguments and will be used to construct httpx Clients internally:
 
-        ``base_url``: The base URL for the API, all requests are made to a relative path to this URL
+        ``base_url``: The base URL for the API, all requests are made to a relative path to this URL. A list of base
+        URLs, which may only differ in scheme, host and port, spreads the requests across several replicas of the
+        service with a connection pool per replica.
 
         ``cookies``: A dictionary of cookies to be sent with every request
 
@@ -25,6 +165,42 @@ class Client:
 
         ``follow_redirects``: Whether or not to follow redirects. Default value is False.
 
+        ``http2``: Whether or not to enable HTTP/2, so that concurrent requests are multiplexed as streams over a few
+        connections instead of queuing for HTTP/1.1 pool slots. Requires the ``h2`` package, installed with
+        ``pip install kaito-rag-engine-client[http2]``. Default value is False.
+
+        ``http1``: Whether or not HTTP/1.1 may be negotiated. Set this to False together with ``http2`` to speak HTTP/2
+        with prior knowledge, which is required for HTTP/2 against a plain ``http://`` base_url. Default value is True.
+
+        ``limits``: The ``httpx.Limits`` for the connection pool, i.e. the maximum number of connections, keep-alive
+        connections and the keep-alive expiry. With HTTP/2 every connection carries as many concurrent streams as the
+        server advertises, so ``max_connections`` bounds the number of connections rather than in-flight requests.
+
+        ``load_balancer``: The ``balancing.LoadBalancer`` picking the replica for each request when ``base_url`` is a
+        list, e.g. ``RoundRobin()``, ``LeastOutstandingRequests()`` or ``EWMALatency()``. Default value is RoundRobin.
+
+        ``resolver``: A ``discovery.Resolver`` (e.g. ``DNSResolver()``) resolving the host of ``base_url``, typically a
+        Kubernetes headless service, to the addresses of its pods. Requests are balanced across the pods with a
+        connection pool per pod, keeping the service name in the ``Host`` header.
+
+        ``resolve_interval``: Seconds between resolutions when ``resolver`` is set. Default value is 10.
+
+        ``hedging``: A ``hedging.HedgingPolicy`` under which read-only calls (``retrieve_index``,
+        ``list_documents_in_index``, ``list_indexes``, ``get_health``) that are slower than the hedge delay are sent a
+        second time, the first response winning. Disabled by default.
+
+        ``retry``: A ``retry.RetryPolicy`` under which calls failing with a retryable status (429, 502, 503, 504) or
+        connection error are retried with exponential backoff, jitter and ``Retry-After``. Only read-only calls are
+        retried unless the policy opts into more. Disabled by default.
+
+        ``circuit_breaker``: A ``breaker.CircuitBreaker`` keeping a circuit per replica and route. While a circuit is
+        open after repeated failures, its calls raise ``errors.CircuitOpenError`` without being sent. Disabled by
+        default.
+
+        ``limiter``: A ``limiter.ConcurrencyLimiter`` capping the requests in flight across all calls and replicas of
+        the client, with a limit adapted to the observed latency and errors. Hedges and retries each take a slot.
+        Disabled by default.
+
         ``httpx_args``: A dictionary of additional arguments to be passed to the ``httpx.Client`` and ``httpx.AsyncClient`` constructor.
 
 
@@ -35,15 +211,42 @@ class Client:
     """
 
     raise_on_unexpected_status: bool = field(default=False, kw_only=True)
-    _base_url: str = field(alias="base_url")
+    _base_url: str | list[str] = field(alias="base_url")
     _cookies: dict[str, str] = field(factory=dict, kw_only=True, alias="cookies")
     _headers: dict[str, str] = field(factory=dict, kw_only=True, alias="headers")
     _timeout: httpx.Timeout | None = field(default=None, kw_only=True, alias="timeout")
     _verify_ssl: str | bool | ssl.SSLContext = field(default=True, kw_only=True, alias="verify_ssl")
     _follow_redirects: bool = field(default=False, kw_only=True, alias="follow_redirects")
+    _http2: bool = field(default=False, kw_only=True, alias="http2")
+    _http1: bool = field(default=True, kw_only=True, alias="http1")
+    _limits: httpx.Limits = field(
+        factory=lambda: httpx.Limits(max_connections=100, max_keepalive_connections=20), kw_only=True, alias="limits"
+    )
+    _load_balancer: LoadBalancer | None = field(default=None, kw_only=True, alias="load_balancer")
+    _resolver: Resolver | None = field(default=None, kw_only=True, alias="resolver")
+    _resolve_interval: float = field(default=10.0, kw_only=True, alias="resolve_interval")
+    _hedging: HedgingPolicy | None = field(default=None, kw_only=True, alias="hedging")
+    _retry: RetryPolicy | None = field(default=None, kw_only=True, alias="retry")
+    _circuit_breaker: CircuitBreaker | None = field(default=None, kw_only=True, alias="circuit_breaker")
+    _limiter: ConcurrencyLimiter | None = field(default=None, kw_only=True, alias="limiter")
     _httpx_args: dict[str, Any] = field(factory=dict, kw_only=True, alias="httpx_args")
     _client: httpx.Client | None = field(default=None, init=False)
     _async_client: httpx.AsyncClient | None = field(default=None, init=False)
+    _endpoint_set: EndpointSet | None = field(default=None, init=False)
+
+    def __attrs_post_init__(self) -> None:
+        if self._resolver is not None:
+            if not isinstance(self._base_url, str):
+                raise ValueError("A resolver discovers the replicas of a single base_url")
+            discovery = ServiceDiscovery(self._base_url, self._resolver, self._resolve_interval)
+            self._endpoint_set = EndpointSet(balancer=self._load_balancer, discovery=discovery)
+        elif not isinstance(self._base_url, str):
+            self._endpoint_set = EndpointSet(self._base_url, self._load_balancer)
+
+    @property
+    def endpoint_set(self) -> EndpointSet | None:
+        """The replicas requests are balanced across, or None when requests go to a single ``base_url``"""
+        return self._endpoint_set
 
     def with_headers(self, headers: dict[str, str]) -> "Client":
         """Get a new client matching this one with additional headers"""
@@ -81,16 +284,32 @@ class Client:
         """Get the underlying httpx.Client, constructing a new one if not previously set"""
         if self._client is None:
             self._client = httpx.Client(
-                base_url=self._base_url,
+                base_url=_primary_base_url(self._base_url),
                 cookies=self._cookies,
                 headers=self._headers,
                 timeout=self._timeout,
                 verify=self._verify_ssl,
                 follow_redirects=self._follow_redirects,
-                **self._httpx_args,
+                http1=self._http1,
+                http2=self._http2,
+                limits=self._limits,
+                **_httpx_args_with_transport(self, asynchronous=False),
             )
         return self._client
 
+    def warm_up(self, n_connections: int) -> list[float]:
+        """Fill the connection pool by opening ``n_connections`` keep-alive connections in parallel
+
+        Sends concurrent ``GET /health`` probes and keeps each response open until all probes have one, so every
+        probe checks out its own pooled connection. Over HTTP/2 the probes share a single multiplexed connection.
+
+        Returns:
+            The seconds each newly opened connection spent on DNS, TCP and TLS setup. Probes served by a connection
+            that was already pooled are not included.
+        """
+        _check_warm_up_size(n_connections, self._limits)
+        return _warm_up(self.get_httpx_client(), n_connections)
+
     def __enter__(self) -> "Client":
         """Enter a context manager for self.client—you cannot enter twice (see httpx docs)"""
         self.get_httpx_client().__enter__()
@@ -112,16 +331,27 @@ class Client:
         """Get the underlying httpx.AsyncClient, constructing a new one if not previously set"""
         if self._async_client is None:
             self._async_client = httpx.AsyncClient(
-                base_url=self._base_url,
+                base_url=_primary_base_url(self._base_url),
                 cookies=self._cookies,
                 headers=self._headers,
                 timeout=self._timeout,
                 verify=self._verify_ssl,
                 follow_redirects=self._follow_redirects,
-                **self._httpx_args,
+                http1=self._http1,
+                http2=self._http2,
+                limits=self._limits,
+                **_httpx_args_with_transport(self, asynchronous=True),
             )
         return self._async_client
 
+    async def async_warm_up(self, n_connections: int) -> list[float]:
+        """Fill the async connection pool by opening ``n_connections`` keep-alive connections concurrently
+
+        The async counterpart of ``warm_up``, returning the seconds each newly opened connection took to set up.
+        """
+        _check_warm_up_size(n_connections, self._limits)
+        return await _async_warm_up(self.get_async_httpx_client(), n_connections)
+
     async def __aenter__(self) -> "Client":
         """Enter a context manager for underlying httpx.AsyncClient—you cannot enter twice (see httpx docs)"""
         await self.get_async_httpx_client().__aenter__()
@@ -138,7 +368,9 @@ class AuthenticatedClient:
 
     The following are accepted as keyword arguments and will be used to construct httpx Clients internally:
 
-        ``base_url``: The base URL for the API, all requests are made to a relative path to this URL
+        ``base_url``: The base URL for the API, all requests are made to a relative path to this URL. A list of base
+        URLs, which may only differ in scheme, host and port, spreads the requests across several replicas of the
+        service with a connection pool per replica.
 
         ``cookies``: A dictionary of cookies to be sent with every request
 
@@ -152,6 +384,42 @@ class AuthenticatedClient:
 
         ``follow_redirects``: Whether or not to follow redirects. Default value is False.
 
+        ``http2``: Whether or not to enable HTTP/2, so that concurrent requests are multiplexed as streams over a few
+        connections instead of queuing for HTTP/1.1 pool slots. Requires the ``h2`` package, installed with
+        ``pip install kaito-rag-engine-client[http2]``. Default value is False.
+
+        ``http1``: Whether or not HTTP/1.1 may be negotiated. Set this to False together with ``http2`` to speak HTTP/2
+        with prior knowledge, which is required for HTTP/2 against a plain ``http://`` base_url. Default value is True.
+
+        ``limits``: The ``httpx.Limits`` for the connection pool, i.e. the maximum number of connections, keep-alive
+        connections and the keep-alive expiry. With HTTP/2 every connection carries as many concurrent streams as the
+        server advertises, so ``max_connections`` bounds the number of connections rather than in-flight requests.
+
+        ``load_balancer``: The ``balancing.LoadBalancer`` picking the replica for each request when ``base_url`` is a
+        list, e.g. ``RoundRobin()``, ``LeastOutstandingRequests()`` or ``EWMALatency()``. Default value is RoundRobin.
+
+        ``resolver``: A ``discovery.Resolver`` (e.g. ``DNSResolver()``) resolving the host of ``base_url``, typically a
+        Kubernetes headless service, to the addresses of its pods. Requests are balanced across the pods with a
+        connection pool per pod, keeping the service name in the ``Host`` header.
+
+        ``resolve_interval``: Seconds between resolutions when ``resolver`` is set. Default value is 10.
+
+        ``hedging``: A ``hedging.HedgingPolicy`` under which read-only calls (``retrieve_index``,
+        ``list_documents_in_index``, ``list_indexes``, ``get_health``) that are slower than the hedge delay are sent a
+        second time, the first response winning. Disabled by default.
+
+        ``retry``: A ``retry.RetryPolicy`` under which calls failing with a retryable status (429, 502, 503, 504) or
+        connection error are retried with exponential backoff, jitter and ``Retry-After``. Only read-only calls are
+        retried unless the policy opts into more. Disabled by default.
+
+        ``circuit_breaker``: A ``breaker.CircuitBreaker`` keeping a circuit per replica and route. While a circuit is
+        open after repeated failures, its calls raise ``errors.CircuitOpenError`` without being sent. Disabled by
+        default.
+
+        ``limiter``: A ``limiter.ConcurrencyLimiter`` capping the requests in flight across all calls and replicas of
+        the client, with a limit adapted to the observed latency and errors. Hedges and retries each take a slot.
+        Disabled by default.
+
         ``httpx_args``: A dictionary of additional arguments to be passed to the ``httpx.Client`` and ``httpx.AsyncClient`` constructor.
 
 
@@ -165,20 +433,47 @@ class AuthenticatedClient:
     """
 
     raise_on_unexpected_status: bool = field(default=False, kw_only=True)
-    _base_url: str = field(alias="base_url")
+    _base_url: str | list[str] = field(alias="base_url")
     _cookies: dict[str, str] = field(factory=dict, kw_only=True, alias="cookies")
     _headers: dict[str, str] = field(factory=dict, kw_only=True, alias="headers")
     _timeout: httpx.Timeout | None = field(default=None, kw_only=True, alias="timeout")
     _verify_ssl: str | bool | ssl.SSLContext = field(default=True, kw_only=True, alias="verify_ssl")
     _follow_redirects: bool = field(default=False, kw_only=True, alias="follow_redirects")
+    _http2: bool = field(default=False, kw_only=True, alias="http2")
+    _http1: bool = field(default=True, kw_only=True, alias="http1")
+    _limits: httpx.Limits = field(
+        factory=lambda: httpx.Limits(max_connections=100, max_keepalive_connections=20), kw_only=True, alias="limits"
+    )
+    _load_balancer: LoadBalancer | None = field(default=None, kw_only=True, alias="load_balancer")
+    _resolver: Resolver | None = field(default=None, kw_only=True, alias="resolver")
+    _resolve_interval: float = field(default=10.0, kw_only=True, alias="resolve_interval")
+    _hedging: HedgingPolicy | None = field(default=None, kw_only=True, alias="hedging")
+    _retry: RetryPolicy | None = field(default=None, kw_only=True, alias="retry")
+    _circuit_breaker: CircuitBreaker | None = field(default=None, kw_only=True, alias="circuit_breaker")
+    _limiter: ConcurrencyLimiter | None = field(default=None, kw_only=True, alias="limiter")
     _httpx_args: dict[str, Any] = field(factory=dict, kw_only=True, alias="httpx_args")
     _client: httpx.Client | None = field(default=None, init=False)
     _async_client: httpx.AsyncClient | None = field(default=None, init=False)
+    _endpoint_set: EndpointSet | None = field(default=None, init=False)
 
     token: str
     prefix: str = "Bearer"
     auth_header_name: str = "Authorization"
 
+    def __attrs_post_init__(self) -> None:
+        if self._resolver is not None:
+            if not isinstance(self._base_url, str):
+                raise ValueError("A resolver discovers the replicas of a single base_url")
+            discovery = ServiceDiscovery(self._base_url, self._resolver, self._resolve_interval)
+            self._endpoint_set = EndpointSet(balancer=self._load_balancer, discovery=discovery)
+        elif not isinstance(self._base_url, str):
+            self._endpoint_set = EndpointSet(self._base_url, self._load_balancer)
+
+    @property
+    def endpoint_set(self) -> EndpointSet | None:
+        """The replicas requests are balanced across, or None when requests go to a single ``base_url``"""
+        return self._endpoint_set
+
     def with_headers(self, headers: dict[str, str]) -> "AuthenticatedClient":
         """Get a new client matching this one with additional headers"""
         if self._client is not None:
@@ -216,16 +511,32 @@ class AuthenticatedClient:
         if self._client is None:
             self._headers[self.auth_header_name] = f"{self.prefix} {self.token}" if self.prefix else self.token
             self._client = httpx.Client(
-                base_url=self._base_url,
+                base_url=_primary_base_url(self._base_url),
                 cookies=self._cookies,
                 headers=self._headers,
                 timeout=self._timeout,
                 verify=self._verify_ssl,
                 follow_redirects=self._follow_redirects,
-                **self._httpx_args,
+                http1=self._http1,
+                http2=self._http2,
+                limits=self._limits,
+                **_httpx_args_with_transport(self, asynchronous=False),
             )
         return self._client
 
+    def warm_up(self, n_connections: int) -> list[float]:
+        """Fill the connection pool by opening ``n_connections`` keep-alive connections in parallel
+
+        Sends concurrent ``GET /health`` probes and keeps each response open until all probes have one, so every
+        probe checks out its own pooled connection. Over HTTP/2 the probes share a single multiplexed connection.
+
+        Returns:
+            The seconds each newly opened connection spent on DNS, TCP and TLS setup. Probes served by a connection
+            that was already pooled are not included.
+        """
+        _check_warm_up_size(n_connections, self._limits)
+        return _warm_up(self.get_httpx_client(), n_connections)
+
     def __enter__(self) -> "AuthenticatedClient":
         """Enter a context manager for self.client—you cannot enter twice (see httpx docs)"""
         self.get_httpx_client().__enter__()
@@ -248,16 +559,27 @@ class AuthenticatedClient:
         if self._async_client is None:
             self._headers[self.auth_header_name] = f"{self.prefix} {self.token}" if self.prefix else self.token
             self._async_client = httpx.AsyncClient(
-                base_url=self._base_url,
+                base_url=_primary_base_url(self._base_url),
                 cookies=self._cookies,
                 headers=self._headers,
                 timeout=self._timeout,
                 verify=self._verify_ssl,
                 follow_redirects=self._follow_redirects,
-                **self._httpx_args,
+                http1=self._http1,
+                http2=self._http2,
+                limits=self._limits,
+                **_httpx_args_with_transport(self, asynchronous=True),
             )
         return self._async_client
 
+    async def async_warm_up(self, n_connections: int) -> list[float]:
+        """Fill the async connection pool by opening ``n_connections`` keep-alive connections concurrently
+
+        The async counterpart of ``warm_up``, returning the seconds each newly opened connection took to set up.
+        """
+        _check_warm_up_size(n_connections, self._limits)
+        return await _async_warm_up(self.get_async_httpx_client(), n_connections)
+
     async def __aenter__(self) -> "AuthenticatedClient":
         """Enter a context manager for underlying httpx.AsyncClient—you cannot enter twice (see httpx docs)"""
         await self.get_async_httpx_client().__aenter__()
@@ -0,0 +1,78 @@
+"""Discovery of RAGEngine replicas behind a Kubernetes headless service
+
+A headless service (``clusterIP: None``) resolves to the IPs of its ready pods. Resolving it periodically and keeping
+a connection pool per pod spreads requests across every replica, where keep-alive connections through a ClusterIP
+would pin each worker to the pod it reached first.
+"""
+
+import socket
+from typing import Protocol
+
+import httpx
+
+
+class Resolver(Protocol):
+    """Resolves a host name to the addresses requests can be sent to"""
+
+    def resolve(self, host: str, port: int) -> list[str]:
+        """Return the IP addresses currently behind ``host``, in preference order"""
+        ...
+
+
+class DNSResolver:
+    """Resolves host names with the system resolver, as ``socket.getaddrinfo`` does
+
+    Args:
+        family: Restrict results to ``socket.AF_INET`` or ``socket.AF_INET6``. Both by default.
+    """
+
+    def __init__(self, family: int = socket.AF_UNSPEC) -> None:
+        self.family = family
+
+    def resolve(self, host: str, port: int) -> list[str]:
+        infos = socket.getaddrinfo(host, port, family=self.family, type=socket.SOCK_STREAM)
+        return list(dict.fromkeys(str(info[4][0]) for info in infos))
+
+
+class ServiceDiscovery:
+    """Turns the addresses a ``Resolver`` returns for a service into replica URLs
+
+    Requests to a discovered replica keep the service's name in their ``Host`` header and TLS server name, so
+    virtual hosting and certificate verification behave as if the service itself had been called.
+
+    Args:
+        service_url: The base URL of the headless service, e.g. ``http://ragengine-headless.default.svc:5000``.
+        resolver: Resolves the service's host name. Defaults to ``DNSResolver()``.
+        interval: Seconds between resolutions. A new resolution is started in the background by the first request
+            after the interval elapsed.
+    """
+
+    def __init__(self, service_url: str | httpx.URL, resolver: Resolver | None = None, interval: float = 10.0) -> None:
+        self.service_url = httpx.URL(service_url)
+        if not self.service_url.host:
+            raise ValueError(f"Cannot discover replicas of {service_url!r} without a host name")
+        self.resolver = resolver if resolver is not None else DNSResolver()
+        self.interval = interval
+
+    @property
+    def authority(self) -> str:
+        """The ``Host`` header requests to a discovered replica carry"""
+        return self.service_url.netloc.decode("ascii")
+
+    def resolve(self) -> list[httpx.URL]:
+        """Resolve the service and return one URL per address
+
+        Raises:
+            httpx.ConnectError: If the service could not be resolved or has no addresses.
+        """
+        port = self.service_url.port or (443 if self.service_url.scheme == "https" else 80)
+        try:
+            addresses = self.resolver.resolve(self.service_url.host, port)
+        except OSError as exc:
+            raise httpx.ConnectError(f"Could not resolve {self.service_url.host}: {exc}") from exc
+        if not addresses:
+            raise httpx.ConnectError(f"{self.service_url.host} has no addresses")
+        return [self.service_url.copy_with(host=address, port=port) for address in addresses]
+
+
+__all__ = ["DNSResolver", "Resolver", "ServiceDiscovery"]
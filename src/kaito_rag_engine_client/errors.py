@@ -13,4 +13,15 @@ class UnexpectedStatus(Exception):
         )
 
 
-__all__ = ["UnexpectedStatus"]
+class CircuitOpenError(Exception):
+    """Raised by api functions instead of sending a request while the circuit breaker of its replica and route is open"""
+
+    def __init__(self, base_url: str, route: str, retry_in: float):
+        self.base_url = base_url
+        self.route = route
+        self.retry_in = retry_in
+
+        super().__init__(f"Circuit open for {route} on {base_url}, next trial request in {retry_in:.1f}s")
+
+
+__all__ = ["CircuitOpenError", "UnexpectedStatus"]
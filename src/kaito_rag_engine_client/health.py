@@ -0,0 +1,214 @@
+"""Background health probing of RAGEngine replicas
+
+A prober calls ``/health`` on every replica of a client at a jittered interval and caches the last ``HealthStatus``
+of each. Replicas that stop reporting healthy, e.g. while they reload an index, are taken out of the client's
+rotation and put back once they report healthy again.
+"""
+
+import asyncio
+import random
+import threading
+from typing import Any
+
+import httpx
+
+from .api.monitoring import get_health
+from .balancing import ENDPOINT_EXTENSION, Endpoint
+from .client import AuthenticatedClient, Client
+from .models.health_status import HealthStatus
+
+
+def _parse_health(response: httpx.Response) -> HealthStatus | None:
+    # Unhealthy replicas may still explain themselves with a HealthStatus body on an error status.
+    try:
+        return HealthStatus.from_dict(response.json())
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+class _HealthTracker:
+    def __init__(
+        self,
+        client: AuthenticatedClient | Client,
+        interval: float,
+        jitter: float,
+        timeout: float,
+        failure_threshold: int,
+        success_threshold: int,
+    ) -> None:
+        if not 0 <= jitter < 1:
+            raise ValueError("jitter must be in [0, 1)")
+        self.client = client
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.success_threshold = success_threshold
+        self.statuses: dict[str, HealthStatus | None] = {}
+        self._streaks: dict[str, int] = {}
+
+    def _targets(self, http: httpx.Client | httpx.AsyncClient) -> list[tuple[str, Endpoint | None]]:
+        endpoint_set = self.client.endpoint_set
+        if endpoint_set is None:
+            return [(str(http.base_url), None)]
+        if not endpoint_set.endpoints:
+            # A discovering client has no replicas before its first request, resolve them now.
+            try:
+                endpoint_set.refresh()
+            except httpx.ConnectError:
+                return []
+        return [(str(endpoint.url), endpoint) for endpoint in endpoint_set.endpoints]
+
+    def _request_kwargs(self, endpoint: Endpoint | None) -> dict[str, Any]:
+        kwargs = get_health._get_kwargs()
+        kwargs["timeout"] = self.timeout
+        if endpoint is not None:
+            kwargs["extensions"] = {ENDPOINT_EXTENSION: endpoint}
+        return kwargs
+
+    def _record(self, key: str, endpoint: Endpoint | None, response: httpx.Response | None) -> None:
+        status = None if response is None else _parse_health(response)
+        healthy = (
+            response is not None
+            and response.status_code == 200
+            and status is not None
+            and status.status.lower() == "healthy"
+        )
+        self.statuses[key] = status
+        # Positive streaks count successes, negative ones failures.
+        streak = self._streaks.get(key, 0)
+        streak = max(streak, 0) + 1 if healthy else min(streak, 0) - 1
+        self._streaks[key] = streak
+        if endpoint is None:
+            return
+        if endpoint.healthy and -streak >= self.failure_threshold:
+            endpoint.healthy = False
+        elif not endpoint.healthy and streak >= self.success_threshold:
+            endpoint.healthy = True
+
+    def _delay(self) -> float:
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class HealthProber(_HealthTracker):
+    """Probes the replicas of a client from a background thread
+
+    Args:
+        client: The client whose replicas are probed. With a single ``base_url`` only its status is cached.
+        interval: Mean seconds between probing rounds.
+        jitter: Fraction of ``interval`` every delay is randomly shortened or lengthened by, so probes of many
+            workers do not arrive at once.
+        timeout: Seconds a single probe may take before it counts as failed.
+        failure_threshold: Consecutive failed probes after which a replica is taken out of rotation.
+        success_threshold: Consecutive healthy probes after which an ejected replica is put back.
+
+    Attributes:
+        statuses: The last ``HealthStatus`` of every replica by URL, None when its last probe got no valid status.
+    """
+
+    def __init__(
+        self,
+        client: AuthenticatedClient | Client,
+        interval: float = 5.0,
+        jitter: float = 0.2,
+        timeout: float = 2.0,
+        failure_threshold: int = 1,
+        success_threshold: int = 1,
+    ) -> None:
+        super().__init__(client, interval, jitter, timeout, failure_threshold, success_threshold)
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def probe(self) -> None:
+        """Probe every replica once"""
+        http = self.client.get_httpx_client()
+        for key, endpoint in self._targets(http):
+            try:
+                response = http.request(**self._request_kwargs(endpoint))
+            except httpx.HTTPError:
+                response = None
+            self._record(key, endpoint, response)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._delay()):
+            self.probe()
+
+    def start(self) -> "HealthProber":
+        """Probe once, then keep probing in a daemon thread until ``stop`` is called"""
+        self.probe()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="kaito-rag-health", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "HealthProber":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+
+class AsyncHealthProber(_HealthTracker):
+    """Probes the replicas of a client from an asyncio task, through its async httpx client
+
+    Takes the same arguments as ``HealthProber``.
+    """
+
+    def __init__(
+        self,
+        client: AuthenticatedClient | Client,
+        interval: float = 5.0,
+        jitter: float = 0.2,
+        timeout: float = 2.0,
+        failure_threshold: int = 1,
+        success_threshold: int = 1,
+    ) -> None:
+        super().__init__(client, interval, jitter, timeout, failure_threshold, success_threshold)
+        self._task: asyncio.Task[None] | None = None
+
+    async def _probe_one(self, http: httpx.AsyncClient, key: str, endpoint: Endpoint | None) -> None:
+        try:
+            response = await http.request(**self._request_kwargs(endpoint))
+        except httpx.HTTPError:
+            response = None
+        self._record(key, endpoint, response)
+
+    async def probe(self) -> None:
+        """Probe every replica once, concurrently"""
+        http = self.client.get_async_httpx_client()
+        await asyncio.gather(*(self._probe_one(http, key, endpoint) for key, endpoint in self._targets(http)))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._delay())
+            await self.probe()
+
+    async def start(self) -> "AsyncHealthProber":
+        """Probe once, then keep probing in a task of the running event loop until ``stop`` is called"""
+        await self.probe()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self) -> "AsyncHealthProber":
+        return await self.start()
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.stop()
+
+
+__all__ = ["AsyncHealthProber", "HealthProber"]
@@ -0,0 +1,215 @@
+"""Hedged requests for read-only calls
+
+When a read-only call (``retrieve_index``, ``list_documents_in_index``, ``list_indexes``, ``get_health``) has not
+answered within the hedge delay, a duplicate is sent, usually to another replica when the client balances across
+several. The first response wins and the other attempt is cancelled, which trims the latency tail caused by a single
+slow replica at the cost of a few percent of extra requests.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import httpx
+
+from ._transport import copy_request
+from .routes import match_route
+
+
+class HedgingPolicy:
+    """Decides which requests are hedged and after how long, and counts the hedges
+
+    Args:
+        delay: Seconds to wait for the first attempt before sending the hedge. By default the delay follows the
+            ``percentile`` of recently observed latencies.
+        percentile: The latency percentile used as delay when ``delay`` is not given, e.g. 95 for the p95.
+        initial_delay: The delay used until ``min_samples`` latencies have been observed.
+        min_samples: Number of observed latencies before the percentile is trusted.
+        window: Number of most recent latencies the percentile is computed over.
+
+    Attributes:
+        hedges_sent: Number of duplicate requests sent.
+        hedges_won: Number of hedged calls answered by the duplicate rather than the first attempt.
+    """
+
+    def __init__(
+        self,
+        delay: float | None = None,
+        percentile: float = 95.0,
+        initial_delay: float = 0.1,
+        min_samples: int = 20,
+        window: int = 1000,
+    ) -> None:
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be in (0, 100)")
+        self.delay = delay
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._cached_delay: float | None = None
+        self._lock = threading.Lock()
+
+    def should_hedge(self, request: httpx.Request) -> bool:
+        """Whether ``request`` is read-only and may therefore be sent twice"""
+        route = match_route(request)
+        return route is not None and route.read_only
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the first attempt before hedging"""
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            if self._cached_delay is None:
+                ordered = sorted(self._latencies)
+                self._cached_delay = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+            return self._cached_delay
+
+    def observe(self, elapsed: float) -> None:
+        """Record the latency of a hedgeable call"""
+        with self._lock:
+            self._latencies.append(elapsed)
+            # Re-sort at most every 5% of the window rather than on every call.
+            if len(self._latencies) % max(1, (self._latencies.maxlen or 0) // 20) == 0:
+                self._cached_delay = None
+
+    def _count(self, sent: int = 0, won: int = 0) -> None:
+        with self._lock:
+            self.hedges_sent += sent
+            self.hedges_won += won
+
+
+def _close_when_done(future: "Future[httpx.Response]") -> None:
+    def close(done: "Future[httpx.Response]") -> None:
+        if not done.cancelled() and done.exception() is None:
+            done.result().close()
+
+    if not future.cancel():
+        future.add_done_callback(close)
+
+
+class HedgingTransport(httpx.BaseTransport):
+    """Hedges the read-only requests ``policy`` selects, sending both attempts from worker threads
+
+    Args:
+        transport: The transport both attempts are sent through.
+        policy: The hedging policy, usually shared with an ``AsyncHedgingTransport``.
+        max_workers: Maximum number of worker threads, each carrying one attempt at a time.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, policy: HedgingPolicy, max_workers: int = 64) -> None:
+        self._transport = transport
+        self.policy = policy
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kaito-rag-hedge")
+
+    def _submit(self, request: httpx.Request) -> "Future[httpx.Response]":
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, self._transport.handle_request, copy_request(request))
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.policy.should_hedge(request):
+            return self._transport.handle_request(request)
+
+        request.read()
+        start = time.perf_counter()
+        first = self._submit(request)
+        done, _ = wait([first], timeout=self.policy.hedge_delay())
+        if done:
+            self.policy.observe(time.perf_counter() - start)
+            return first.result()
+
+        hedge = self._submit(request)
+        self.policy._count(sent=1)
+        pending = {first, hedge}
+        error: BaseException | None = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        _close_when_done(loser)
+                    self.policy._count(won=int(future is hedge))
+                    self.policy.observe(time.perf_counter() - start)
+                    return future.result()
+                error = error or future.exception()
+        assert error is not None
+        raise error
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self._transport.close()
+
+
+async def _aclose_when_done(task: "asyncio.Task[httpx.Response]") -> None:
+    task.cancel()
+    try:
+        response = await task
+    except (Exception, asyncio.CancelledError):
+        return
+    await response.aclose()
+
+
+class AsyncHedgingTransport(httpx.AsyncBaseTransport):
+    """Hedges the read-only requests ``policy`` selects, running both attempts as asyncio tasks"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: HedgingPolicy) -> None:
+        self._transport = transport
+        self.policy = policy
+        self._cleanup: set[asyncio.Task[None]] = set()
+
+    def _cancel(self, tasks: set["asyncio.Task[httpx.Response]"]) -> None:
+        for task in tasks:
+            cleanup = asyncio.ensure_future(_aclose_when_done(task))
+            self._cleanup.add(cleanup)
+            cleanup.add_done_callback(self._cleanup.discard)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.policy.should_hedge(request):
+            return await self._transport.handle_async_request(request)
+
+        await request.aread()
+        start = time.perf_counter()
+
+        def attempt() -> "asyncio.Task[httpx.Response]":
+            return asyncio.ensure_future(self._transport.handle_async_request(copy_request(request)))
+
+        first = attempt()
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.policy.hedge_delay())
+            if done:
+                self.policy.observe(time.perf_counter() - start)
+                return first.result()
+
+            hedge = attempt()
+            self.policy._count(sent=1)
+            pending.add(hedge)
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._cancel(pending)
+                        pending = set()
+                        self.policy._count(won=int(task is hedge))
+                        self.policy.observe(time.perf_counter() - start)
+                        return task.result()
+                    error = error or task.exception()
+            assert error is not None
+            raise error
+        except asyncio.CancelledError:
+            self._cancel(pending)
+            raise
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+__all__ = ["AsyncHedgingTransport", "HedgingPolicy", "HedgingTransport"]
@@ -0,0 +1,341 @@
+"""Adaptive client-side concurrency limiting
+
+A ``ConcurrencyLimiter`` caps the number of requests a client has in flight across all endpoints and replicas, and
+adjusts the cap from the latency and errors of the requests it lets through. Requests over the limit wait for a slot
+in the client instead of queuing in the server, so bulk ingestion running next to interactive chat slows down
+before the server's latency collapses.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Collection
+from typing import Protocol
+
+import httpx
+
+from ._transport import _AsyncReleasingStream, _ReleasingStream
+
+
+class LimitAlgorithm(Protocol):
+    """Computes the concurrency limit from the outcome of every request"""
+
+    @property
+    def limit(self) -> int: ...
+
+    def update(self, rtt: float, in_flight: int, dropped: bool) -> None:
+        """Adjust the limit after a request
+
+        Args:
+            rtt: Seconds until the response headers arrived.
+            in_flight: Number of requests in flight when the request was sent, including itself.
+            dropped: Whether the request was rejected or timed out, i.e. a sign of overload.
+        """
+
+
+class AIMDLimit:
+    """Additive increase, multiplicative decrease
+
+    The limit grows by one after every successful request sent while at least half the limit was in use, and shrinks
+    by ``backoff_ratio`` after every dropped request or one slower than ``latency_threshold``.
+
+    Args:
+        initial_limit: The limit before any request was observed.
+        min_limit: Lower bound of the limit.
+        max_limit: Upper bound of the limit.
+        backoff_ratio: Factor the limit is multiplied with on overload.
+        latency_threshold: Seconds after which a successful request still counts as dropped, None to only count
+            errors.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        backoff_ratio: float = 0.9,
+        latency_threshold: float | None = None,
+    ) -> None:
+        if not 0 < backoff_ratio < 1:
+            raise ValueError("backoff_ratio must be in (0, 1)")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_threshold = latency_threshold
+        self._limit = initial_limit
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def update(self, rtt: float, in_flight: int, dropped: bool) -> None:
+        if dropped or (self.latency_threshold is not None and rtt > self.latency_threshold):
+            self._limit = max(self.min_limit, int(self._limit * self.backoff_ratio))
+        elif in_flight * 2 >= self._limit:
+            self._limit = min(self.max_limit, self._limit + 1)
+
+
+class GradientLimit:
+    """Vegas-style limit following the gradient between the long-term and the current latency
+
+    While the recent latency stays at the long-term baseline the limit grows by a queue allowance of ``sqrt(limit)``.
+    When the latency rises above ``tolerance`` times the baseline, i.e. requests start queuing in the server, the limit
+    shrinks in proportion, by at most half per update. Dropped requests count as the steepest gradient.
+
+    Args:
+        initial_limit: The limit before any request was observed.
+        min_limit: Lower bound of the limit.
+        max_limit: Upper bound of the limit.
+        tolerance: Ratio of the current to the baseline latency that is tolerated before the limit shrinks.
+        smoothing: Weight of every new limit estimate against the current limit.
+        long_window: Number of requests the baseline latency is averaged over.
+        short_window: Number of requests the current latency is averaged over.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        long_window: int = 600,
+        short_window: int = 10,
+    ) -> None:
+        if tolerance < 1:
+            raise ValueError("tolerance must be at least 1")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._long_alpha = 2 / (long_window + 1)
+        self._short: deque[float] = deque(maxlen=short_window)
+        self._long_rtt: float | None = None
+        self._estimate = float(initial_limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._estimate)
+
+    def update(self, rtt: float, in_flight: int, dropped: bool) -> None:
+        self._short.append(rtt)
+        short_rtt = sum(self._short) / len(self._short)
+        if self._long_rtt is None:
+            self._long_rtt = short_rtt
+        else:
+            self._long_rtt += (short_rtt - self._long_rtt) * self._long_alpha
+        # Let the baseline catch up quickly when latency returns to normal after a long period of overload.
+        if self._long_rtt > short_rtt * 2:
+            self._long_rtt *= 0.9
+
+        if dropped:
+            gradient = 0.5
+        else:
+            gradient = max(0.5, min(1.0, self.tolerance * self._long_rtt / short_rtt))
+        # An application sending less than half the limit gives no evidence that the limit can grow.
+        if not dropped and in_flight * 2 < self._estimate:
+            return
+        new_limit = self._estimate * gradient + math.sqrt(self._estimate)
+        self._estimate = self._estimate * (1 - self.smoothing) + new_limit * self.smoothing
+        self._estimate = max(float(self.min_limit), min(float(self.max_limit), self._estimate))
+
+
+class ConcurrencyLimiter:
+    """Lets at most ``limit`` requests of a client be in flight and adapts the limit with ``algorithm``
+
+    A request holds its slot until its response is closed. Requests over the limit wait for the pool timeout of the
+    client, then raise ``httpx.PoolTimeout``. Sync and async clients may share a limiter.
+
+    Args:
+        algorithm: The ``LimitAlgorithm``, e.g. ``AIMDLimit()`` or ``GradientLimit()``. Default value is AIMDLimit.
+        drop_statuses: Response status codes that count as dropped, i.e. signal overload.
+    """
+
+    def __init__(
+        self,
+        algorithm: LimitAlgorithm | None = None,
+        drop_statuses: Collection[int] = frozenset({429, 503, 504}),
+    ) -> None:
+        self.algorithm = algorithm if algorithm is not None else AIMDLimit()
+        self.drop_statuses = frozenset(drop_statuses)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._async_waiters: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future[None]]] = deque()
+
+    @property
+    def limit(self) -> int:
+        """The current concurrency limit, e.g. for a metrics gauge"""
+        return self.algorithm.limit
+
+    @property
+    def in_flight(self) -> int:
+        """The number of requests currently holding a slot"""
+        return self._in_flight
+
+    def _try_acquire(self) -> int | None:
+        # Must hold the condition's lock.
+        if self._in_flight >= self.algorithm.limit:
+            return None
+        self._in_flight += 1
+        return self._in_flight
+
+    def acquire(self, timeout: float | None = None) -> int:
+        """Wait for a slot
+
+        Returns:
+            The number of requests in flight including this one, to be passed on to ``release``.
+
+        Raises:
+            httpx.PoolTimeout: If no slot became free within ``timeout`` seconds.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._in_flight < self.algorithm.limit, timeout):
+                raise httpx.PoolTimeout("Timed out waiting for a slot of the concurrency limiter")
+            self._in_flight += 1
+            return self._in_flight
+
+    async def async_acquire(self, timeout: float | None = None) -> int:
+        """Wait for a slot without blocking the event loop, see ``acquire``"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._condition:
+                in_flight = self._try_acquire()
+                if in_flight is not None:
+                    return in_flight
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                self._abandon(loop, waiter)
+                raise httpx.PoolTimeout("Timed out waiting for a slot of the concurrency limiter") from None
+            except asyncio.CancelledError:
+                self._abandon(loop, waiter)
+                raise
+
+    def _abandon(self, loop: asyncio.AbstractEventLoop, waiter: "asyncio.Future[None]") -> None:
+        with self._condition:
+            try:
+                self._async_waiters.remove((loop, waiter))
+            except ValueError:
+                # The waiter was already woken up, pass its wake-up on.
+                self._wake()
+
+    def _wake(self) -> None:
+        # Must hold the condition's lock.
+        free = self.algorithm.limit - self._in_flight
+        if free <= 0:
+            return
+        self._condition.notify(free)
+        for _ in range(min(free, len(self._async_waiters))):
+            loop, waiter = self._async_waiters.popleft()
+            loop.call_soon_threadsafe(_set_waiter, waiter)
+
+    def release(self, in_flight: int, rtt: float | None, dropped: bool = False) -> None:
+        """Free a slot and feed the outcome of its request to the algorithm
+
+        Args:
+            in_flight: What ``acquire`` returned for the request.
+            rtt: Seconds until the response headers arrived, None if the request ended without an outcome, e.g. when
+                it was cancelled.
+            dropped: Whether the request signals overload.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if rtt is not None:
+                self.algorithm.update(rtt, in_flight, dropped)
+            self._wake()
+
+    def _is_dropped(self, error: BaseException | None, response: httpx.Response | None) -> bool:
+        if response is not None:
+            return response.status_code in self.drop_statuses
+        return isinstance(error, httpx.TimeoutException)
+
+
+def _set_waiter(waiter: "asyncio.Future[None]") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _pool_timeout(request: httpx.Request) -> float | None:
+    timeout = request.extensions.get("timeout", {})
+    return timeout.get("pool")
+
+
+class ConcurrencyLimitTransport(httpx.BaseTransport):
+    """Holds a slot of ``limiter`` for every request from sending it until its response is closed
+
+    Args:
+        transport: The transport admitted requests are sent through.
+        limiter: The concurrency limiter, usually shared with an ``AsyncConcurrencyLimitTransport``.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, limiter: ConcurrencyLimiter) -> None:
+        self._transport = transport
+        self.limiter = limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        in_flight = self.limiter.acquire(_pool_timeout(request))
+        start = time.perf_counter()
+        try:
+            response = self._transport.handle_request(request)
+        except httpx.TransportError as error:
+            self.limiter.release(in_flight, time.perf_counter() - start, self.limiter._is_dropped(error, None))
+            raise
+        except BaseException:
+            self.limiter.release(in_flight, None)
+            raise
+        rtt = time.perf_counter() - start
+        dropped = self.limiter._is_dropped(None, response)
+        assert isinstance(response.stream, httpx.SyncByteStream)
+        response.stream = _ReleasingStream(response.stream, lambda: self.limiter.release(in_flight, rtt, dropped))
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncConcurrencyLimitTransport(httpx.AsyncBaseTransport):
+    """The async counterpart of ``ConcurrencyLimitTransport``"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: ConcurrencyLimiter) -> None:
+        self._transport = transport
+        self.limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        in_flight = await self.limiter.async_acquire(_pool_timeout(request))
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.TransportError as error:
+            self.limiter.release(in_flight, time.perf_counter() - start, self.limiter._is_dropped(error, None))
+            raise
+        except BaseException:
+            self.limiter.release(in_flight, None)
+            raise
+        rtt = time.perf_counter() - start
+        dropped = self.limiter._is_dropped(None, response)
+
+        async def release() -> None:
+            self.limiter.release(in_flight, rtt, dropped)
+
+        assert isinstance(response.stream, httpx.AsyncByteStream)
+        response.stream = _AsyncReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+__all__ = [
+    "AIMDLimit",
+    "AsyncConcurrencyLimitTransport",
+    "ConcurrencyLimitTransport",
+    "ConcurrencyLimiter",
+    "GradientLimit",
+    "LimitAlgorithm",
+]
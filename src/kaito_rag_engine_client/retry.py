@@ -0,0 +1,208 @@
+"""Retries of failed calls with exponential backoff, jitter and ``Retry-After``
+
+Retries happen in the client's transport, below the generated endpoint functions, so every ``sync_detailed`` and
+``asyncio_detailed`` call gets them and every attempt re-sends the body serialized by the first one. Only read-only
+calls (GETs and ``/retrieve``) are retried unless the policy opts into more.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Collection
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from ._transport import copy_request
+from .errors import CircuitOpenError
+from .routes import match_route
+
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+
+RETRYABLE_ERRORS: tuple[type[Exception], ...] = (
+    # Behind a load balancer the retry of a call failed fast by an open circuit goes to another replica.
+    CircuitOpenError,
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.ReadError,
+    httpx.RemoteProtocolError,
+    httpx.PoolTimeout,
+)
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Decides which failed calls are retried and how long to wait before each retry
+
+    Args:
+        max_attempts: Maximum number of attempts per call, including the first one.
+        backoff: Upper bound in seconds of the wait before the first retry. It doubles with every further retry.
+        max_backoff: Upper bound in seconds of any wait computed from ``backoff``.
+        jitter: Whether to wait a uniformly random time up to the computed backoff ("full jitter"), so that
+            clients failing together do not retry together.
+        statuses: Response status codes that are retried.
+        respect_retry_after: Whether a ``Retry-After`` header on a retryable response sets the wait instead.
+        max_retry_after: Longest ``Retry-After`` in seconds the policy waits for. Responses asking for longer are
+            returned to the caller without retrying.
+        retry_non_idempotent: Opt into retrying every call, including ``create_index``, ``persist_index``,
+            ``delete_index`` and ``chat``, which may then take effect more than once.
+        retry_routes: Opt into retrying individual routes that are not read-only, given as ``"METHOD template"``,
+            e.g. ``{"POST /indexes/{index_name}/documents"}``.
+
+    Attributes:
+        retries: Number of retries sent under this policy.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff: float = 0.1,
+        max_backoff: float = 5.0,
+        jitter: bool = True,
+        statuses: Collection[int] = RETRYABLE_STATUSES,
+        respect_retry_after: bool = True,
+        max_retry_after: float = 30.0,
+        retry_non_idempotent: bool = False,
+        retry_routes: Collection[str] = (),
+    ) -> None:
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+        self.retry_non_idempotent = retry_non_idempotent
+        self.retry_routes = frozenset(retry_routes)
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def allows(self, request: httpx.Request) -> bool:
+        """Whether ``request`` may be sent more than once"""
+        if self.retry_non_idempotent:
+            return True
+        route = match_route(request)
+        if route is None:
+            return request.method in ("GET", "HEAD", "OPTIONS")
+        return route.read_only or str(route) in self.retry_routes
+
+    def delay(self, attempt: int, response: httpx.Response | None = None) -> float | None:
+        """Seconds to wait before retrying after the ``attempt``-th attempt, or None to not retry
+
+        Args:
+            attempt: The number of attempts sent so far.
+            response: The retryable response of the last attempt, None if it raised a retryable error.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if response is not None and self.respect_retry_after:
+            retry_after = _retry_after(response)
+            if retry_after is not None:
+                return retry_after if retry_after <= self.max_retry_after else None
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def _count(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Retries the requests ``policy`` allows when they fail with a retryable status or transport error
+
+    Args:
+        transport: The transport every attempt is sent through.
+        policy: The retry policy, usually shared with an ``AsyncRetryTransport``.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, policy: RetryPolicy) -> None:
+        self._transport = transport
+        self.policy = policy
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.policy.allows(request):
+            return self._transport.handle_request(request)
+
+        request.read()
+        attempt = 1
+        while True:
+            try:
+                response = self._transport.handle_request(copy_request(request))
+            except RETRYABLE_ERRORS:
+                delay = self.policy.delay(attempt)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code not in self.policy.statuses:
+                    return response
+                delay = self.policy.delay(attempt, response)
+                if delay is None:
+                    return response
+                # Reading the rest of the error body lets its connection go back to the pool.
+                response.read()
+                response.close()
+            self.policy._count()
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """The async counterpart of ``RetryTransport``"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: RetryPolicy) -> None:
+        self._transport = transport
+        self.policy = policy
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.policy.allows(request):
+            return await self._transport.handle_async_request(request)
+
+        await request.aread()
+        attempt = 1
+        while True:
+            try:
+                response = await self._transport.handle_async_request(copy_request(request))
+            except RETRYABLE_ERRORS:
+                delay = self.policy.delay(attempt)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code not in self.policy.statuses:
+                    return response
+                delay = self.policy.delay(attempt, response)
+                if delay is None:
+                    return response
+                await response.aread()
+                await response.aclose()
+            self.policy._count()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+__all__ = ["RETRYABLE_ERRORS", "RETRYABLE_STATUSES", "AsyncRetryTransport", "RetryPolicy", "RetryTransport"]
@@ -0,0 +1,68 @@
+"""The routes of the RAGEngine API, as seen by transports that treat requests differently per route
+
+Transports only see an ``httpx.Request``. ``match_route`` maps it back to the route template of the endpoint that
+built it, e.g. ``/indexes/{index_name}/documents``, and tells whether the call is read-only and therefore safe to
+send more than once.
+"""
+
+import re
+
+import httpx
+from attrs import define, field
+
+
+@define(frozen=True)
+class Route:
+    """A method and path template of the API
+
+    Attributes:
+        method: The HTTP method in upper case.
+        template: The path template as it appears in the OpenAPI document.
+        read_only: Whether the call has no side effects on the server, so it may be retried or hedged.
+    """
+
+    method: str
+    template: str
+    read_only: bool = False
+    _pattern: re.Pattern[str] = field(init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self) -> None:
+        # Path parameters are quoted with safe="" by the endpoints, so they never contain a slash. Matching the end
+        # of the path keeps routes recognisable behind a base_url with a path prefix.
+        pattern = re.sub(r"\\{[^/]+?\\}", "[^/]+", re.escape(self.template))
+        object.__setattr__(self, "_pattern", re.compile(f"{pattern}$"))
+
+    def matches(self, method: str, path: str) -> bool:
+        return method.upper() == self.method and self._pattern.search(path) is not None
+
+    def __str__(self) -> str:
+        return f"{self.method} {self.template}"
+
+
+ROUTES: tuple[Route, ...] = (
+    Route("POST", "/v1/chat/completions"),
+    Route("POST", "/retrieve", read_only=True),
+    Route("POST", "/index"),
+    Route("GET", "/indexes", read_only=True),
+    Route("DELETE", "/indexes/{index_name}"),
+    Route("GET", "/indexes/{index_name}/documents", read_only=True),
+    Route("POST", "/indexes/{index_name}/documents"),
+    Route("POST", "/indexes/{index_name}/documents/delete"),
+    Route("POST", "/persist/{index_name}"),
+    Route("POST", "/load/{index_name}"),
+    Route("GET", "/health", read_only=True),
+    Route("GET", "/metrics", read_only=True),
+)
+
+
+def match_route(request: httpx.Request) -> Route | None:
+    """Return the API route ``request`` was built for, or None if it is not part of the API"""
+    # The raw path keeps quoted slashes of path parameters quoted.
+    path = request.url.raw_path.split(b"?", 1)[0].decode("ascii")
+    for route in ROUTES:
+        if route.matches(request.method, path):
+            return route
+    return None
+
+
+__all__ = ["ROUTES", "Route", "match_route"]
@@ -6,12 +6,31 @@ focusing on sync methods for chat, index management, document management,
 query, and monitoring functionality.
 """
 
+import asyncio
+import json
+import threading
+import time
 import pytest
 from unittest.mock import Mock, patch
 import httpx
 from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from kaito_rag_engine_client.client import Client, AuthenticatedClient
+from kaito_rag_engine_client.balancing import (
+    EWMALatency,
+    EndpointSet,
+    LeastOutstandingRequests,
+    LoadBalancingTransport,
+    RoundRobin,
+)
+from kaito_rag_engine_client.breaker import CircuitBreaker, CircuitState
+from kaito_rag_engine_client.discovery import ServiceDiscovery
+from kaito_rag_engine_client.errors import CircuitOpenError
+from kaito_rag_engine_client.health import AsyncHealthProber, HealthProber
+from kaito_rag_engine_client.hedging import HedgingPolicy
+from kaito_rag_engine_client.limiter import AIMDLimit, ConcurrencyLimiter, GradientLimit
+from kaito_rag_engine_client.retry import RetryPolicy
 from kaito_rag_engine_client.models.chat_request import ChatRequest
 from kaito_rag_engine_client.models.chat_completion_response import ChatCompletionResponse
 from kaito_rag_engine_client.models.index_request import IndexRequest
@@ -19,11 +38,14 @@ from kaito_rag_engine_client.models.document import Document
 from kaito_rag_engine_client.models.delete_document_request import DeleteDocumentRequest
 from kaito_rag_engine_client.models.update_document_request import UpdateDocumentRequest
 from kaito_rag_engine_client.models.health_status import HealthStatus
+from kaito_rag_engine_client.models.retrieve_request import RetrieveRequest
+from kaito_rag_engine_client.models.retrieve_response import RetrieveResponse
 from kaito_rag_engine_client.models.http_validation_error import HTTPValidationError
 
 from kaito_rag_engine_client.api.chat import chat
 from kaito_rag_engine_client.api.index import (
     create_index,
+    retrieve_index,
     delete_index,
     list_indexes,
     load_index,
@@ -35,6 +57,57 @@ from kaito_rag_engine_client.api.index import (
 from kaito_rag_engine_client.api.monitoring import get_health, get_metrics
 
 
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Answers like a RAGEngine replica, recording the client port of every request."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status, payload):
+        self.server.requests.append((self.command, self.path, self.client_address[1]))
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self._reply(200, {"status": "Healthy"} if self.path == "/health" else ["test-index"])
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(200, {"query": "q", "results": [], "count": 0})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve_stand_in(host="127.0.0.1", port=0):
+    """Serve the stand-in handler, on a free port by default, until the generator is closed."""
+    server = ThreadingHTTPServer((host, port), _StandInHandler)
+    server.daemon_threads = True
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def local_server():
+    yield from _serve_stand_in()
+
+
+@pytest.fixture
+def second_server():
+    yield from _serve_stand_in()
+
+
+def _server_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
 class TestClientSetup:
     """Test basic client setup and configuration."""
 
@@ -68,6 +141,661 @@ class TestClientSetup:
         client_with_timeout = client.with_timeout(timeout)
         assert client_with_timeout._timeout == timeout
 
+    def test_client_http2_configuration(self):
+        """Test HTTP/2 and pool limits are applied to both httpx clients."""
+        pytest.importorskip("h2")
+        limits = httpx.Limits(max_connections=8, max_keepalive_connections=4)
+        client = Client(base_url="http://localhost:5789", http2=True, http1=False, limits=limits)
+
+        for httpx_client in (client.get_httpx_client(), client.get_async_httpx_client()):
+            pool = httpx_client._transport._pool
+            assert pool._http2 is True
+            assert pool._http1 is False
+            assert pool._max_connections == 8
+            assert pool._max_keepalive_connections == 4
+
+    def test_warm_up_opens_connections_in_parallel(self, local_server):
+        """Test warm_up fills the pool with one connection per probe and reports setup times."""
+        client = Client(base_url=_server_url(local_server))
+
+        timings = client.warm_up(4)
+
+        assert len(timings) == 4
+        assert all(t > 0 for t in timings)
+        assert len({port for _, _, port in local_server.requests}) == 4
+        assert len(client.get_httpx_client()._transport._pool.connections) == 4
+
+    def test_async_warm_up_opens_connections_concurrently(self, local_server):
+        """Test async_warm_up fills the async pool."""
+        client = AuthenticatedClient(base_url=_server_url(local_server), token="test-token")
+
+        async def run():
+            async with client:
+                timings = await client.async_warm_up(3)
+                return timings, len(client.get_async_httpx_client()._transport._pool.connections)
+
+        timings, pooled = asyncio.run(run())
+
+        assert len(timings) == 3
+        assert pooled == 3
+        assert all(path == "/health" for _, path, _ in local_server.requests)
+
+    def test_warm_up_rejects_more_connections_than_the_pool_allows(self):
+        """Test warm_up refuses sizes that would block on the pool."""
+        client = Client(base_url="http://localhost:5789", limits=httpx.Limits(max_connections=2))
+        with pytest.raises(ValueError):
+            client.warm_up(3)
+
+    def test_client_defaults_to_http1(self):
+        """Test HTTP/2 is opt-in."""
+        pool = AuthenticatedClient(base_url="http://localhost:5789", token="t").get_httpx_client()._transport._pool
+        assert pool._http1 is True
+        assert pool._http2 is False
+
+
+class TestLoadBalancing:
+    """Test client-side load balancing across replicas."""
+
+    def test_round_robin_spreads_generated_endpoints(self, local_server, second_server):
+        """Test unchanged api modules are spread over every replica with a pool per replica."""
+        client = Client(base_url=[_server_url(local_server), _server_url(second_server)])
+
+        for _ in range(4):
+            assert list_indexes.sync(client=client) == ["test-index"]
+        get_health.sync(client=client)
+        get_health.sync(client=client)
+
+        assert len(local_server.requests) == 3
+        assert len(second_server.requests) == 3
+        assert all(e.outstanding == 0 for e in client.endpoint_set.endpoints)
+
+    def test_async_requests_are_rewritten_to_the_picked_replica(self):
+        """Test the async transport rewrites the origin and Host header of each request."""
+        seen = []
+
+        def handler(request):
+            seen.append((str(request.url), request.headers["Host"]))
+            return httpx.Response(200, json=["index1"])
+
+        client = Client(
+            base_url=["http://replica-a:5000", "http://replica-b:5001"],
+            httpx_args={"transport": httpx.MockTransport(handler)},
+        )
+
+        async def run():
+            return [await list_indexes.asyncio(client=client) for _ in range(2)]
+
+        assert asyncio.run(run()) == [["index1"], ["index1"]]
+        assert seen == [
+            ("http://replica-a:5000/indexes", "replica-a:5000"),
+            ("http://replica-b:5001/indexes", "replica-b:5001"),
+        ]
+
+    def test_least_outstanding_requests_picks_the_idlest_replica(self):
+        """Test least-outstanding balancing."""
+        endpoints = EndpointSet(["http://a", "http://b", "http://c"], LeastOutstandingRequests())
+        a, b, c = endpoints.endpoints
+        a.outstanding, b.outstanding, c.outstanding = 3, 1, 2
+
+        assert endpoints.acquire() is b
+        assert b.outstanding == 2
+        endpoints.release(b)
+        assert b.outstanding == 1
+
+    def test_ewma_latency_prefers_the_fastest_replica(self):
+        """Test EWMA balancing tries unseen replicas and then avoids slow ones."""
+        endpoints = EndpointSet(["http://fast", "http://slow"], EWMALatency(alpha=0.5))
+        fast, slow = endpoints.endpoints
+        endpoints.observe(fast, 0.01, failed=False)
+        assert endpoints.acquire() is slow
+
+        endpoints.release(slow)
+        endpoints.observe(slow, 0.5, failed=False)
+        endpoints.observe(slow, 0.3, failed=False)
+        assert slow.latency == pytest.approx(0.4)
+        assert all(endpoints.acquire() is fast for _ in range(5))
+
+    def test_unhealthy_replicas_are_skipped(self):
+        """Test replicas out of rotation only receive traffic when none is healthy."""
+        endpoints = EndpointSet(["http://a", "http://b"], RoundRobin())
+        a, b = endpoints.endpoints
+        a.healthy = False
+        assert [endpoints.acquire() for _ in range(3)] == [b, b, b]
+        b.healthy = False
+        assert {endpoints.acquire().url.host for _ in range(4)} == {"a", "b"}
+
+
+class _FakeResolver:
+    """Resolves every host to a fixed, changeable list of addresses."""
+
+    def __init__(self, *addresses):
+        self.addresses = list(addresses)
+        self.calls = 0
+
+    def resolve(self, host, port):
+        self.calls += 1
+        return list(self.addresses)
+
+
+class TestServiceDiscovery:
+    """Test headless-service discovery with a connection pool per pod."""
+
+    @pytest.fixture
+    def pod_servers(self, local_server):
+        """Two stand-in pods on different loopback addresses sharing one port."""
+        port = local_server.server_address[1]
+        for other in _serve_stand_in("127.0.0.2", port):
+            yield port, local_server, other
+
+    def test_requests_are_spread_across_resolved_pods(self, pod_servers):
+        """Test each resolved pod gets its own pool and a share of the requests."""
+        port, first, second = pod_servers
+        resolver = _FakeResolver("127.0.0.1", "127.0.0.2")
+        client = Client(base_url=f"http://rag-headless.test:{port}", resolver=resolver)
+
+        for _ in range(4):
+            assert list_indexes.sync(client=client) == ["test-index"]
+
+        assert len(first.requests) == 2
+        assert len(second.requests) == 2
+        assert resolver.calls == 1
+        assert len(client.get_httpx_client()._transport._pools.all()) == 2
+
+    def test_discovered_requests_keep_the_service_authority(self):
+        """Test requests to a pod IP carry the service name as Host header and TLS server name."""
+        seen = []
+
+        def handler(request):
+            seen.append((request.url.host, request.headers["Host"], request.extensions.get("sni_hostname")))
+            return httpx.Response(200, json=["index1"])
+
+        client = Client(
+            base_url="https://rag-headless.test:5000",
+            resolver=_FakeResolver("10.0.0.7"),
+            httpx_args={"transport": httpx.MockTransport(handler)},
+        )
+
+        list_indexes.sync(client=client)
+
+        assert seen == [("10.0.0.7", "rag-headless.test:5000", "rag-headless.test")]
+
+    def test_refresh_retires_the_pools_of_departed_pods(self):
+        """Test re-resolution keeps stats of remaining pods and closes pools of removed ones."""
+        closed = []
+
+        class Pool(httpx.MockTransport):
+            def close(self):
+                closed.append(self)
+
+        resolver = _FakeResolver("10.0.0.1", "10.0.0.2")
+        endpoints = EndpointSet(discovery=ServiceDiscovery("http://svc:5000", resolver, interval=0))
+        transport = LoadBalancingTransport(endpoints, transport_factory=lambda: Pool(lambda r: httpx.Response(200)))
+        with httpx.Client(transport=transport, base_url="http://svc:5000") as http:
+            http.get("/health")
+            http.get("/health")
+            pools = transport._pools.all()
+            kept = endpoints.endpoints[1]
+
+            resolver.addresses = ["10.0.0.2", "10.0.0.3"]
+            endpoints.refresh()
+            http.get("/health")
+
+        assert [e.url.host for e in endpoints.endpoints] == ["10.0.0.2", "10.0.0.3"]
+        assert endpoints.endpoints[0] is kept
+        assert closed[0] is pools[0]
+
+    def test_failed_resolution_raises_connect_error(self):
+        """Test a service without addresses fails like an unreachable server."""
+        client = Client(base_url="http://rag-headless.test:5000", resolver=_FakeResolver())
+        with pytest.raises(httpx.ConnectError):
+            list_indexes.sync_detailed(client=client)
+
+
+class TestHealthProbing:
+    """Test health-probe driven ejection of replicas."""
+
+    @pytest.fixture
+    def replicas(self):
+        """Replica health by host, and the hosts list_indexes calls reached."""
+        return {"a": "Healthy", "b": "Healthy"}, []
+
+    @pytest.fixture
+    def client(self, replicas):
+        health, reached = replicas
+
+        def handler(request):
+            if request.url.path == "/health":
+                status = health[request.url.host]
+                return httpx.Response(200 if status == "Healthy" else 503, json={"status": status})
+            reached.append(request.url.host)
+            return httpx.Response(200, json=[])
+
+        return Client(base_url=["http://a", "http://b"], httpx_args={"transport": httpx.MockTransport(handler)})
+
+    def test_unhealthy_replica_is_ejected_and_restored(self, client, replicas):
+        """Test a replica leaves rotation while unhealthy and returns once it recovers."""
+        health, reached = replicas
+        prober = HealthProber(client, failure_threshold=1, success_threshold=2)
+
+        health["b"] = "Unhealthy"
+        prober.probe()
+        for _ in range(3):
+            list_indexes.sync(client=client)
+        assert reached == ["a", "a", "a"]
+        assert prober.statuses["http://b"].status == "Unhealthy"
+
+        health["b"] = "Healthy"
+        prober.probe()
+        assert not client.endpoint_set.endpoints[1].healthy
+        prober.probe()
+        assert client.endpoint_set.endpoints[1].healthy
+        assert prober.statuses["http://b"].status == "Healthy"
+
+    def test_unreachable_replica_is_ejected(self):
+        """Test probes that fail to connect eject the replica and cache no status."""
+        def handler(request):
+            if request.url.host == "b":
+                raise httpx.ConnectError("refused")
+            return httpx.Response(200, json={"status": "Healthy"})
+
+        client = Client(base_url=["http://a", "http://b"], httpx_args={"transport": httpx.MockTransport(handler)})
+        with HealthProber(client, interval=60) as prober:
+            pass
+
+        assert [e.healthy for e in client.endpoint_set.endpoints] == [True, False]
+        assert prober.statuses == {"http://a": HealthStatus(status="Healthy"), "http://b": None}
+
+    def test_async_prober_runs_as_a_task(self, client, replicas):
+        """Test the asyncio prober probes on start and keeps probing in the background."""
+        health, _ = replicas
+        health["a"] = "Unhealthy"
+
+        async def run():
+            async with AsyncHealthProber(client, interval=0.01, jitter=0.5) as prober:
+                assert not client.endpoint_set.endpoints[0].healthy
+                health["a"] = "Healthy"
+                for _ in range(100):
+                    if client.endpoint_set.endpoints[0].healthy:
+                        break
+                    await asyncio.sleep(0.01)
+                return prober._task
+
+        task = asyncio.run(run())
+        assert client.endpoint_set.endpoints[0].healthy
+        assert task.cancelled()
+
+
+class TestHedging:
+    """Test hedged read-only requests."""
+
+    RETRIEVED = {"query": "q", "results": [], "count": 0}
+
+    @pytest.fixture
+    def retrieve_request(self):
+        return RetrieveRequest(index_name="test-index", query="q")
+
+    def test_slow_replica_is_hedged_and_the_duplicate_wins(self, retrieve_request):
+        """Test a retrieve call slower than the delay is answered by the hedge sent to the other replica."""
+        release = threading.Event()
+
+        def handler(request):
+            if request.url.host == "slow":
+                release.wait(5)
+            return httpx.Response(200, json=self.RETRIEVED)
+
+        policy = HedgingPolicy(delay=0.05)
+        client = Client(
+            base_url=["http://slow", "http://fast"],
+            hedging=policy,
+            httpx_args={"transport": httpx.MockTransport(handler)},
+        )
+
+        result = retrieve_index.sync(client=client, body=retrieve_request)
+        release.set()
+
+        assert isinstance(result, RetrieveResponse)
+        assert (policy.hedges_sent, policy.hedges_won) == (1, 1)
+
+    def test_fast_calls_and_writes_are_not_hedged(self, retrieve_request, sample_index_request):
+        """Test calls answering within the delay and non read-only calls are sent once."""
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            if request.url.path == "/index":
+                threading.Event().wait(0.1)
+                return httpx.Response(200, json=[])
+            return httpx.Response(200, json=self.RETRIEVED)
+
+        policy = HedgingPolicy(delay=0.05)
+        client = Client(
+            base_url="http://localhost:5789", hedging=policy, httpx_args={"transport": httpx.MockTransport(handler)}
+        )
+
+        retrieve_index.sync(client=client, body=retrieve_request)
+        create_index.sync(client=client, body=sample_index_request)
+
+        assert calls == ["/retrieve", "/index"]
+        assert policy.hedges_sent == 0
+
+    def test_async_hedge_cancels_the_losing_attempt(self, retrieve_request):
+        """Test the async transport cancels the slower attempt once the hedge answered."""
+        cancelled = []
+        attempts = 0
+
+        async def handler(request):
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(request.url.path)
+                    raise
+            return httpx.Response(200, json=self.RETRIEVED)
+
+        policy = HedgingPolicy(delay=0.02)
+        client = Client(
+            base_url="http://localhost:5789", hedging=policy, httpx_args={"transport": httpx.MockTransport(handler)}
+        )
+
+        async def run():
+            result = await retrieve_index.asyncio(client=client, body=retrieve_request)
+            await asyncio.sleep(0.01)
+            return result
+
+        assert isinstance(asyncio.run(run()), RetrieveResponse)
+        assert cancelled == ["/retrieve"]
+        assert (policy.hedges_sent, policy.hedges_won) == (1, 1)
+
+    def test_delay_follows_the_observed_percentile(self):
+        """Test the adaptive delay is the configured percentile of observed latencies."""
+        policy = HedgingPolicy(percentile=95, initial_delay=0.5, min_samples=10, window=100)
+        assert policy.hedge_delay() == 0.5
+        for i in range(100):
+            policy.observe(i / 1000)
+        assert policy.hedge_delay() == pytest.approx(0.095)
+
+    @pytest.fixture
+    def sample_index_request(self):
+        return IndexRequest(index_name="test-index", documents=[Document(text="Sample document text")])
+
+
+class TestRetry:
+    """Test the idempotency-aware retry policy."""
+
+    @staticmethod
+    def _client(handler, policy):
+        return Client(
+            base_url="http://localhost:5789", retry=policy, httpx_args={"transport": httpx.MockTransport(handler)}
+        )
+
+    def test_read_only_call_is_retried_with_the_serialized_body(self):
+        """Test retrieve is retried on 503 and every attempt re-sends the body serialized once."""
+        bodies = []
+        statuses = iter([503, 502, 200])
+
+        def handler(request):
+            bodies.append(request.content)
+            return httpx.Response(next(statuses), json={"query": "q", "results": [], "count": 0})
+
+        policy = RetryPolicy(max_attempts=3, backoff=0)
+        body = RetrieveRequest(index_name="test-index", query="q")
+        with patch.object(RetrieveRequest, "to_dict", autospec=True, side_effect=RetrieveRequest.to_dict) as to_dict:
+            response = retrieve_index.sync_detailed(client=self._client(handler, policy), body=body)
+
+        assert response.status_code == HTTPStatus.OK
+        assert isinstance(response.parsed, RetrieveResponse)
+        assert to_dict.call_count == 1
+        assert len(bodies) == 3 and len(set(bodies)) == 1
+        assert policy.retries == 2
+
+    def test_non_idempotent_calls_are_not_retried_unless_opted_in(self):
+        """Test create_index and delete_index are sent once unless the policy opts into their routes."""
+        calls = []
+
+        def handler(request):
+            calls.append(request.method)
+            return httpx.Response(503)
+
+        body = IndexRequest(index_name="test-index", documents=[Document(text="text")])
+        create_index.sync_detailed(client=self._client(handler, RetryPolicy(backoff=0)), body=body)
+        delete_index.sync_detailed(client=self._client(handler, RetryPolicy(backoff=0)), index_name="test-index")
+        assert calls == ["POST", "DELETE"]
+
+        calls.clear()
+        opted_in = RetryPolicy(max_attempts=2, backoff=0, retry_routes={"POST /index"})
+        create_index.sync_detailed(client=self._client(handler, opted_in), body=body)
+        assert calls == ["POST", "POST"]
+
+    def test_retry_after_sets_the_wait(self):
+        """Test Retry-After in seconds and as an HTTP date, and that waits beyond the cap are not retried."""
+        policy = RetryPolicy(max_attempts=5, backoff=0.1, jitter=False, max_retry_after=10)
+
+        assert policy.delay(1, httpx.Response(503, headers={"Retry-After": "2"})) == 2.0
+        assert policy.delay(1, httpx.Response(503, headers={"Retry-After": "60"})) is None
+        assert policy.delay(1, httpx.Response(503, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0
+        assert [policy.delay(n, httpx.Response(503)) for n in (1, 2, 3)] == [0.1, 0.2, 0.4]
+        assert policy.delay(5, httpx.Response(503)) is None
+
+    def test_async_connection_errors_are_retried(self):
+        """Test the async transport retries a GET after a connection error."""
+        attempts = []
+
+        async def handler(request):
+            attempts.append(request.url.path)
+            if len(attempts) == 1:
+                raise httpx.ConnectError("connection reset")
+            return httpx.Response(200, json=["index1"])
+
+        client = self._client(handler, RetryPolicy(backoff=0))
+        assert asyncio.run(list_indexes.asyncio(client=client)) == ["index1"]
+        assert attempts == ["/indexes", "/indexes"]
+
+
+class TestCircuitBreaker:
+    """Test the per-replica and per-route circuit breaker."""
+
+    def test_circuit_opens_per_route_and_recovers_through_half_open(self):
+        """Test failures open only the failing route's circuit, which fails fast until a trial call closes it."""
+        failing = {"retrieve": True}
+        sent = []
+        transitions = []
+
+        def handler(request):
+            sent.append(request.url.path)
+            if request.url.path == "/retrieve" and failing["retrieve"]:
+                raise httpx.ReadTimeout("wedged")
+            return httpx.Response(200, json={"query": "q", "results": [], "count": 0} if request.method == "POST" else [])
+
+        breaker = CircuitBreaker(
+            failure_threshold=2, reset_timeout=0.05, on_transition=lambda *change: transitions.append(change)
+        )
+        client = Client(
+            base_url="http://localhost:5789",
+            circuit_breaker=breaker,
+            httpx_args={"transport": httpx.MockTransport(handler)},
+        )
+        body = RetrieveRequest(index_name="test-index", query="q")
+        for _ in range(2):
+            with pytest.raises(httpx.ReadTimeout):
+                retrieve_index.sync_detailed(client=client, body=body)
+        with pytest.raises(CircuitOpenError) as error:
+            retrieve_index.sync_detailed(client=client, body=body)
+        assert error.value.route == "POST /retrieve" and error.value.base_url == "http://localhost:5789"
+        assert sent == ["/retrieve", "/retrieve"]
+
+        # Other routes of the same replica keep their own circuit.
+        assert list_indexes.sync(client=client) == []
+        assert breaker.states() == {
+            ("http://localhost:5789", "POST /retrieve"): CircuitState.OPEN,
+            ("http://localhost:5789", "GET /indexes"): CircuitState.CLOSED,
+        }
+
+        time.sleep(0.06)
+        failing["retrieve"] = False
+        assert retrieve_index.sync_detailed(client=client, body=body).status_code == HTTPStatus.OK
+        assert breaker.state("http://localhost:5789", "POST /retrieve") is CircuitState.CLOSED
+        assert [change[1:] for change in transitions] == [
+            (CircuitState.CLOSED, CircuitState.OPEN),
+            (CircuitState.OPEN, CircuitState.HALF_OPEN),
+            (CircuitState.HALF_OPEN, CircuitState.CLOSED),
+        ]
+
+    def test_failed_trial_reopens_and_only_one_trial_is_admitted(self):
+        """Test a half-open circuit admits a single trial call and re-opens when it fails."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        key = ("http://replica:5000", "POST /retrieve")
+
+        breaker.release(key, breaker.acquire(key), failed=True)
+        assert breaker.acquire(key) is True
+        with pytest.raises(CircuitOpenError):
+            breaker.acquire(key)
+        breaker.release(key, True, failed=True)
+        assert breaker.states()[key] is CircuitState.OPEN
+        assert breaker.transitions[(CircuitState.HALF_OPEN, CircuitState.OPEN)] == 1
+
+    def test_client_errors_do_not_open_the_circuit(self):
+        """Test 4xx responses count as successes of a replica that is answering."""
+        breaker = CircuitBreaker(failure_threshold=1)
+        client = Client(
+            base_url="http://localhost:5789",
+            circuit_breaker=breaker,
+            httpx_args={"transport": httpx.MockTransport(lambda request: httpx.Response(404))},
+        )
+        for _ in range(3):
+            delete_index.sync_detailed(client=client, index_name="missing")
+        assert breaker.states() == {("http://localhost:5789", "DELETE /indexes/{index_name}"): CircuitState.CLOSED}
+
+    def test_open_replica_is_retried_on_another_replica(self, local_server, second_server):
+        """Test with several replicas a call failed fast by an open circuit is retried on a healthy replica."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        wedged = _server_url(local_server)
+        breaker.release((wedged, "GET /indexes"), breaker.acquire((wedged, "GET /indexes")), failed=True)
+        client = Client(
+            base_url=[wedged, _server_url(second_server)],
+            circuit_breaker=breaker,
+            retry=RetryPolicy(backoff=0),
+        )
+
+        async def list_twice():
+            return [await list_indexes.asyncio(client=client) for _ in range(2)]
+
+        assert asyncio.run(list_twice()) == [["test-index"], ["test-index"]]
+        assert local_server.requests == []
+
+
+class TestConcurrencyLimiter:
+    """Test the adaptive client-side concurrency limiter."""
+
+    @staticmethod
+    def _concurrency_tracker():
+        lock = threading.Lock()
+        state = {"current": 0, "peak": 0}
+
+        def enter():
+            with lock:
+                state["current"] += 1
+                state["peak"] = max(state["peak"], state["current"])
+
+        def leave():
+            with lock:
+                state["current"] -= 1
+
+        return state, enter, leave
+
+    def test_aimd_grows_additively_and_backs_off_multiplicatively(self):
+        """Test AIMD grows by one when the limit is in use, ignores idle samples and shrinks on drops."""
+        algorithm = AIMDLimit(initial_limit=10, max_limit=11, backoff_ratio=0.5, latency_threshold=1.0)
+
+        algorithm.update(0.01, in_flight=2, dropped=False)
+        assert algorithm.limit == 10
+        algorithm.update(0.01, in_flight=5, dropped=False)
+        algorithm.update(0.01, in_flight=5, dropped=False)
+        assert algorithm.limit == 11
+        algorithm.update(0.01, in_flight=5, dropped=True)
+        assert algorithm.limit == 5
+        algorithm.update(2.0, in_flight=5, dropped=False)
+        assert algorithm.limit == 2
+
+    def test_gradient_shrinks_when_latency_rises(self):
+        """Test the gradient limit grows at the baseline latency and shrinks once requests queue in the server."""
+        algorithm = GradientLimit(initial_limit=20, short_window=1)
+        for _ in range(20):
+            algorithm.update(0.01, in_flight=20, dropped=False)
+        grown = algorithm.limit
+        assert grown > 20
+
+        for _ in range(10):
+            algorithm.update(0.1, in_flight=grown, dropped=False)
+        assert algorithm.limit < grown
+
+    def test_sync_calls_share_the_limit(self):
+        """Test threads using one client never have more requests in flight than the limit."""
+        state, enter, leave = self._concurrency_tracker()
+
+        def handler(request):
+            enter()
+            time.sleep(0.02)
+            leave()
+            return httpx.Response(200, json=["index1"])
+
+        limiter = ConcurrencyLimiter(AIMDLimit(initial_limit=2, max_limit=2))
+        client = Client(
+            base_url="http://localhost:5789", limiter=limiter, httpx_args={"transport": httpx.MockTransport(handler)}
+        )
+        threads = [threading.Thread(target=list_indexes.sync, kwargs={"client": client}) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert state["peak"] == 2
+        assert limiter.in_flight == 0 and limiter.limit == 2
+
+    def test_async_calls_wait_for_a_slot_up_to_the_pool_timeout(self):
+        """Test async calls queue for slots and give up with PoolTimeout after the pool timeout."""
+        state, enter, leave = self._concurrency_tracker()
+
+        async def handler(request):
+            enter()
+            await asyncio.sleep(0.05)
+            leave()
+            return httpx.Response(200, json=["index1"])
+
+        def client(timeout=None):
+            return Client(
+                base_url="http://localhost:5789",
+                limiter=limiter,
+                timeout=timeout,
+                httpx_args={"transport": httpx.MockTransport(handler)},
+            )
+
+        limiter = ConcurrencyLimiter(AIMDLimit(initial_limit=3, max_limit=3))
+        patient, impatient = client(), client(httpx.Timeout(5.0, pool=0.01))
+
+        async def run():
+            calls = [list_indexes.asyncio(client=patient) for _ in range(6)]
+            results = await asyncio.gather(*calls)
+            with pytest.raises(httpx.PoolTimeout):
+                await asyncio.gather(*(list_indexes.asyncio(client=impatient) for _ in range(4)))
+            return results
+
+        assert asyncio.run(run()) == [["index1"]] * 6
+        assert state["peak"] == 3
+        assert limiter.in_flight == 0
+
+    def test_overload_statuses_lower_the_limit(self):
+        """Test 503 responses count as dropped and shrink the limit."""
+        limiter = ConcurrencyLimiter(AIMDLimit(initial_limit=10, backoff_ratio=0.5))
+        client = Client(
+            base_url="http://localhost:5789",
+            limiter=limiter,
+            httpx_args={"transport": httpx.MockTransport(lambda request: httpx.Response(503))},
+        )
+        list_indexes.sync_detailed(client=client)
+        assert limiter.limit == 5
+
 
 class TestChatAPI:
     """Test chat completion API endpoints."""